@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-import httpx
+import asyncio
 
 from .config import Settings
+from .http_pool import get_client
+from .resilience import send_with_retry
 
 
 def _build_headers(settings: Settings) -> dict:
@@ -21,14 +23,15 @@ async def list_messages(
     if limit <= 0:
         return []
 
-    timeout = httpx.Timeout(settings.request_timeout_seconds)
     url = f"/api/v1/accounts/{account_id}/conversations/{conversation_id}/messages"
     params = {"limit": limit}
 
-    async with httpx.AsyncClient(base_url=settings.chatwoot_base_url, timeout=timeout) as client:
-        response = await client.get(url, headers=_build_headers(settings), params=params)
-        response.raise_for_status()
-        data = response.json()
+    client = get_client(settings, settings.chatwoot_base_url)
+    response = await send_with_retry(
+        settings, client, "GET", url, headers=_build_headers(settings), params=params
+    )
+    response.raise_for_status()
+    data = response.json()
 
     return data.get("payload", [])
 
@@ -46,11 +49,12 @@ async def create_message(
         "private": False,
         "content_type": "text",
     }
-    timeout = httpx.Timeout(settings.request_timeout_seconds)
 
-    async with httpx.AsyncClient(base_url=settings.chatwoot_base_url, timeout=timeout) as client:
-        response = await client.post(url, headers=_build_headers(settings), json=payload)
-        response.raise_for_status()
+    client = get_client(settings, settings.chatwoot_base_url)
+    response = await send_with_retry(
+        settings, client, "POST", url, headers=_build_headers(settings), json=payload
+    )
+    response.raise_for_status()
 
 
 async def assign_conversation(
@@ -61,11 +65,12 @@ async def assign_conversation(
 ) -> None:
     url = f"/api/v1/accounts/{account_id}/conversations/{conversation_id}/assignments"
     payload = {"team_id": team_id} if team_id is not None else {"assignee_id": None}
-    timeout = httpx.Timeout(settings.request_timeout_seconds)
 
-    async with httpx.AsyncClient(base_url=settings.chatwoot_base_url, timeout=timeout) as client:
-        response = await client.post(url, headers=_build_headers(settings), json=payload)
-        response.raise_for_status()
+    client = get_client(settings, settings.chatwoot_base_url)
+    response = await send_with_retry(
+        settings, client, "POST", url, headers=_build_headers(settings), json=payload
+    )
+    response.raise_for_status()
 
 
 async def open_conversation_from_bot(
@@ -74,15 +79,17 @@ async def open_conversation_from_bot(
     conversation_id: int,
 ) -> None:
     url = f"/api/v1/accounts/{account_id}/conversations/{conversation_id}/toggle_status"
-    timeout = httpx.Timeout(settings.request_timeout_seconds)
 
-    async with httpx.AsyncClient(base_url=settings.chatwoot_base_url, timeout=timeout) as client:
-        response = await client.post(
-            url,
-            headers=_build_headers(settings),
-            json={"status": "open"},
-        )
-        response.raise_for_status()
+    client = get_client(settings, settings.chatwoot_base_url)
+    response = await send_with_retry(
+        settings,
+        client,
+        "POST",
+        url,
+        headers=_build_headers(settings),
+        json={"status": "open"},
+    )
+    response.raise_for_status()
 
 
 async def handoff_conversation(
@@ -92,8 +99,19 @@ async def handoff_conversation(
     team_id: int | None,
     message: str,
 ) -> None:
-    await create_message(settings, account_id, conversation_id, message)
-    await assign_conversation(settings, account_id, conversation_id)
-    if team_id is not None:
-        await assign_conversation(settings, account_id, conversation_id, team_id)
-    await open_conversation_from_bot(settings, account_id, conversation_id)
+    # The customer message and the assignment are independent, but the
+    # conversation must only be opened once it is routed. Chatwoot clears an
+    # assignee outside the new team, so unassigning first is only needed
+    # when no team is given.
+    message_result, assign_result = await asyncio.gather(
+        create_message(settings, account_id, conversation_id, message),
+        assign_conversation(settings, account_id, conversation_id, team_id),
+        return_exceptions=True,
+    )
+    # Once routed, the conversation is opened even if the customer message
+    # failed; otherwise it stays pending and the bot keeps answering it.
+    if not isinstance(assign_result, BaseException):
+        await open_conversation_from_bot(settings, account_id, conversation_id)
+    for result in (assign_result, message_result):
+        if isinstance(result, BaseException):
+            raise result
@@ -9,6 +9,11 @@ def _get_env(name: str, default: str | None = None, required: bool = False) -> s
     return value
 
 
+def _get_id_set(name: str) -> frozenset[int]:
+    value = _get_env(name, "") or ""
+    return frozenset(int(part) for part in value.split(",") if part.strip())
+
+
 @dataclass(frozen=True)
 class Settings:
     chatwoot_base_url: str
@@ -16,25 +21,60 @@ class Settings:
     openai_api_key: str
     openai_base_url: str
     openai_model: str
+    openai_fast_model: str
+    routing_enabled: bool
+    routing_fast_max_chars: int
     system_prompt: str
     history_messages: int
+    summary_enabled: bool
+    summary_recent_messages: int
+    summary_trigger_messages: int
+    summary_max_chars: int
+    summary_model: str
+    summary_ttl_seconds: float
     request_timeout_seconds: float
+    http_max_connections: int
+    http_max_keepalive_connections: int
     rag_enabled: bool
     rag_store_path: str
     rag_top_k: int
     rag_chunk_size: int
     rag_chunk_overlap: int
+    rag_quantization: str
+    rag_rerank_candidates: int
+    rag_embed_cache_size: int
+    rag_warmup_questions_path: str | None
+    warmup_timeout_seconds: float
+    warmup_connections: int
+    readiness_recheck_seconds: float
     openai_embed_model: str
     system_prompt_path: str | None
     tools_enabled: bool
     tools_config_path: str
     tool_choice: str
     max_tool_rounds: int
+    tool_timeout_seconds: float
+    tool_host_concurrency: int
     knowledge_path: str | None
     default_response_language: str
     handoff_enabled: bool
     handoff_team_id: int | None
     handoff_message: str
+    webhook_account_ids: frozenset[int]
+    webhook_inbox_ids: frozenset[int]
+    state_backend: str
+    state_path: str
+    shard_count: int
+    shard_lease_seconds: float
+    conversation_lock_seconds: float
+    dedup_ttl_seconds: float
+    retry_max_attempts: int
+    retry_base_delay_seconds: float
+    retry_max_delay_seconds: float
+    circuit_failure_threshold: int
+    circuit_reset_seconds: float
+    rate_limit_per_second: float
+    rate_limit_burst: int
 
 
 def load_settings() -> Settings:
@@ -46,26 +86,61 @@ def load_settings() -> Settings:
         openai_api_key=_get_env("OPENAI_API_KEY", required=True),
         openai_base_url=_get_env("OPENAI_BASE_URL", "https://openrouter.ai/api/v1"),
         openai_model=_get_env("OPENAI_MODEL", "openai/gpt-4o-mini"),
+        openai_fast_model=_get_env("OPENAI_FAST_MODEL", ""),
+        routing_enabled=_get_env("ROUTING_ENABLED", "0") == "1",
+        routing_fast_max_chars=int(_get_env("ROUTING_FAST_MAX_CHARS", "80")),
         system_prompt=_get_env(
             "SYSTEM_PROMPT",
             "あなたはZ-SOFT株式会社（Z-SOFT Co., Ltd.）の公式カスタマーサポートAI「Z-Lumina」です。常に丁寧・簡潔・誠実に回答してください。会社情報: 所在地は愛知県名古屋市（大名古屋ビルヂング）、設立は2023年10月。主な事業は 1) AI・先端技術開発（自社AI製品 Z-Lumina、デジタルヒューマン、ロボット） 2) システム受託開発（金融・製造・官公庁向けSI、設計〜保守、オフショア開発） 3) SES事業（技術者派遣、バイリンガル対応の国際案件）。技術的強みはAI実装、React/Next.js/TypeScript/Go、AWS/GCP/Docker/Kubernetes、DevOps/IaC。特徴は名古屋拠点でグローバル展開（中国支社等）を加速し、先端技術とコスト競争力（オフショア）を両立していること。質問に不明点がある場合は推測せず確認質問を行い、未確定情報はその旨を明示してください。",
         ),
         history_messages=int(_get_env("HISTORY_MESSAGES", "10")),
+        summary_enabled=_get_env("SUMMARY_ENABLED", "0") == "1",
+        summary_recent_messages=int(_get_env("SUMMARY_RECENT_MESSAGES", "6")),
+        summary_trigger_messages=int(_get_env("SUMMARY_TRIGGER_MESSAGES", "8")),
+        summary_max_chars=int(_get_env("SUMMARY_MAX_CHARS", "1500")),
+        summary_model=_get_env("SUMMARY_MODEL", ""),
+        summary_ttl_seconds=float(_get_env("SUMMARY_TTL_SECONDS", "2592000")),
         request_timeout_seconds=float(_get_env("REQUEST_TIMEOUT_SECONDS", "30")),
+        http_max_connections=int(_get_env("HTTP_MAX_CONNECTIONS", "100")),
+        http_max_keepalive_connections=int(_get_env("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
         rag_enabled=_get_env("RAG_ENABLED", "0") == "1",
         rag_store_path=_get_env("RAG_STORE_PATH", "rag_store.jsonl"),
         rag_top_k=int(_get_env("RAG_TOP_K", "4")),
         rag_chunk_size=int(_get_env("RAG_CHUNK_SIZE", "800")),
         rag_chunk_overlap=int(_get_env("RAG_CHUNK_OVERLAP", "120")),
+        rag_quantization=_get_env("RAG_QUANTIZATION", "float32"),
+        rag_rerank_candidates=int(_get_env("RAG_RERANK_CANDIDATES", "0")),
+        rag_embed_cache_size=int(_get_env("RAG_EMBED_CACHE_SIZE", "1024")),
+        rag_warmup_questions_path=_get_env("RAG_WARMUP_QUESTIONS_PATH", None),
+        warmup_timeout_seconds=float(_get_env("WARMUP_TIMEOUT_SECONDS", "10")),
+        warmup_connections=int(_get_env("WARMUP_CONNECTIONS", "2")),
+        readiness_recheck_seconds=float(_get_env("READINESS_RECHECK_SECONDS", "15")),
         openai_embed_model=_get_env("OPENAI_EMBED_MODEL", "text-embedding-3-small"),
         system_prompt_path=_get_env("SYSTEM_PROMPT_PATH", None),
         tools_enabled=_get_env("TOOLS_ENABLED", "0") == "1",
         tools_config_path=_get_env("TOOLS_CONFIG_PATH", "tools.json"),
         tool_choice=_get_env("TOOL_CHOICE", "auto"),
         max_tool_rounds=int(_get_env("MAX_TOOL_ROUNDS", "2")),
+        tool_timeout_seconds=float(_get_env("TOOL_TIMEOUT_SECONDS", "10")),
+        tool_host_concurrency=int(_get_env("TOOL_HOST_CONCURRENCY", "4")),
         knowledge_path=_get_env("KNOWLEDGE_PATH", "knowledge.md"),
         default_response_language=_get_env("DEFAULT_RESPONSE_LANGUAGE", "ja"),
         handoff_enabled=_get_env("HANDOFF_ENABLED", "1") == "1",
         handoff_team_id=int(handoff_team_id) if handoff_team_id else None,
         handoff_message=_get_env("HANDOFF_MESSAGE", "担当者におつなぎします。しばらくお待ちください。"),
+        webhook_account_ids=_get_id_set("WEBHOOK_ACCOUNT_IDS"),
+        webhook_inbox_ids=_get_id_set("WEBHOOK_INBOX_IDS"),
+        state_backend=_get_env("STATE_BACKEND", "memory"),
+        state_path=_get_env("STATE_PATH", "bot_state.sqlite3"),
+        shard_count=int(_get_env("SHARD_COUNT", "0")),
+        shard_lease_seconds=float(_get_env("SHARD_LEASE_SECONDS", "30")),
+        conversation_lock_seconds=float(_get_env("CONVERSATION_LOCK_SECONDS", "120")),
+        dedup_ttl_seconds=float(_get_env("DEDUP_TTL_SECONDS", "86400")),
+        retry_max_attempts=int(_get_env("RETRY_MAX_ATTEMPTS", "3")),
+        retry_base_delay_seconds=float(_get_env("RETRY_BASE_DELAY_SECONDS", "0.5")),
+        retry_max_delay_seconds=float(_get_env("RETRY_MAX_DELAY_SECONDS", "10")),
+        circuit_failure_threshold=int(_get_env("CIRCUIT_FAILURE_THRESHOLD", "5")),
+        circuit_reset_seconds=float(_get_env("CIRCUIT_RESET_SECONDS", "30")),
+        rate_limit_per_second=float(_get_env("RATE_LIMIT_PER_SECOND", "0")),
+        rate_limit_burst=int(_get_env("RATE_LIMIT_BURST", "10")),
     )
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from .config import Settings, load_settings
+from .openai_client import embed_texts
+from .rag_store import RagDocument, RagStore
+
+
+def _load_labelled(path: Path) -> list[tuple[str, set[str]]]:
+    """Read ``{"question": ..., "relevant": [...]}`` lines.
+
+    A relevant entry matches a retrieved chunk by its id or its ``source``
+    metadata, so whole files can be labelled without knowing chunk ids.
+    """
+    items = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        data = json.loads(line)
+        relevant = data.get("relevant") or []
+        if isinstance(relevant, str):
+            relevant = [relevant]
+        if data.get("question") and relevant:
+            items.append((data["question"], set(relevant)))
+    return items
+
+
+async def embed_in_batches(
+    settings: Settings,
+    texts: list[str],
+    batch_size: int,
+    concurrency: int,
+) -> list[list[float]]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _embed(batch: list[str]) -> list[list[float]]:
+        async with semaphore:
+            return await embed_texts(settings, batch)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), max(1, batch_size))]
+    results = await asyncio.gather(*(_embed(batch) for batch in batches))
+    return [embedding for batch in results for embedding in batch]
+
+
+def _matched(doc: RagDocument, relevant: set[str]) -> set[str]:
+    return relevant & {doc.id, doc.metadata.get("source")}
+
+
+def score(
+    retrieved: list[list[RagDocument]],
+    labels: list[set[str]],
+    ks: list[int],
+) -> dict[str, float]:
+    recall = {k: 0.0 for k in ks}
+    reciprocal_rank = 0.0
+
+    for docs, relevant in zip(retrieved, labels):
+        for k in ks:
+            found: set[str] = set()
+            for doc in docs[:k]:
+                found |= _matched(doc, relevant)
+            recall[k] += len(found) / len(relevant)
+        for rank, doc in enumerate(docs, start=1):
+            if _matched(doc, relevant):
+                reciprocal_rank += 1 / rank
+                break
+
+    total = max(1, len(labels))
+    metrics = {f"recall@{k}": recall[k] / total for k in ks}
+    metrics[f"mrr@{max(ks)}"] = reciprocal_rank / total
+    return metrics
+
+
+def _overlap(retrieved: list[list[RagDocument]], exact: list[list[RagDocument]], k: int) -> float:
+    """Fraction of the exact float32 top-k that a quantized search also returned."""
+    total = 0.0
+    for docs, reference in zip(retrieved, exact):
+        expected = {doc.id for doc in reference[:k]}
+        total += len(expected & {doc.id for doc in docs[:k]}) / max(1, len(expected))
+    return total / max(1, len(exact))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate RAG retrieval against a labelled question set")
+    parser.add_argument("labelled", help='JSONL file of {"question": ..., "relevant": [doc id or source path, ...]}')
+    parser.add_argument("--k", default="1,3,5,10", help="Comma-separated cutoffs for recall@k")
+    parser.add_argument("--batch-size", type=int, default=64, help="Questions per embedding request")
+    parser.add_argument("--concurrency", type=int, default=4, help="Embedding requests in flight")
+    parser.add_argument(
+        "--quantization",
+        default=None,
+        help="Comma-separated index formats to compare (float32,float16,int8); defaults to RAG_QUANTIZATION",
+    )
+    parser.add_argument("--rerank", type=int, default=None, help="Override RAG_RERANK_CANDIDATES")
+    args = parser.parse_args()
+
+    settings = load_settings()
+    items = _load_labelled(Path(args.labelled))
+    if not items:
+        print("No labelled questions found")
+        return
+    ks = sorted({int(k) for k in args.k.split(",") if k.strip()})
+    modes = [mode.strip() for mode in (args.quantization or settings.rag_quantization).split(",") if mode.strip()]
+    rerank = settings.rag_rerank_candidates if args.rerank is None else args.rerank
+
+    questions = [question for question, _ in items]
+    started = time.perf_counter()
+    embeddings = asyncio.run(embed_in_batches(settings, questions, args.batch_size, args.concurrency))
+    embed_seconds = time.perf_counter() - started
+
+    print(f"Evaluated {len(items)} questions against {settings.rag_store_path}")
+    print(f"embedding    {len(items) / embed_seconds:.1f} queries/s ({embed_seconds:.2f}s)")
+    labels = [relevant for _, relevant in items]
+    exact: list[list[RagDocument]] | None = None
+    for mode in ["float32"] + [mode for mode in modes if mode != "float32"]:
+        store = RagStore(settings.rag_store_path, mode, rerank)
+        store.load()
+        started = time.perf_counter()
+        retrieved = store.query_batch(embeddings, max(ks))
+        search_seconds = time.perf_counter() - started
+        if exact is None:
+            exact = retrieved
+            if mode not in modes:
+                continue
+
+        label = mode if not store.rerank_candidates else f"{mode}+rerank{store.rerank_candidates}"
+        print(f"\n[{label}] index {store.index_bytes / 2**20:.2f} MiB for {len(store)} chunks")
+        for name, value in score(retrieved, labels, ks).items():
+            print(f"{name:<12} {value:.4f}")
+        if mode != "float32":
+            print(f"{'exact@' + str(max(ks)):<12} {_overlap(retrieved, exact, max(ks)):.4f}")
+        print(f"search       {len(items) / max(search_seconds, 1e-9):.1f} queries/s ({search_seconds:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import httpx
+
+from .config import Settings
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def get_client(settings: Settings, base_url: str = "") -> httpx.AsyncClient:
+    """Return the shared keep-alive client for ``base_url``, creating it on first use."""
+    client = _clients.get(base_url)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(settings.request_timeout_seconds),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+            ),
+        )
+        _clients[base_url] = client
+    return client
+
+
+async def close_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+from typing import Any, Awaitable, Callable
+from urllib.parse import quote, urlsplit
+
+import httpx
+
+from .config import Settings
+from .http_pool import get_client
+from .resilience import CircuitOpenError, send_with_retry
+
+_PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+_MAX_TEXT_RESULT = 2000
+
+_host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+class ToolError(Exception):
+    """A transient tool failure; its message goes to the model but is never cached."""
+
+
+def _host_semaphore(settings: Settings, url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    semaphore = _host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, settings.tool_host_concurrency))
+        _host_semaphores[host] = semaphore
+    return semaphore
+
+
+def _render_url(template: str, arguments: dict[str, Any]) -> str:
+    return _PLACEHOLDER.sub(lambda m: quote(str(arguments.get(m.group(1), "")), safe=""), template)
+
+
+def _render_value(value: Any, arguments: dict[str, Any]) -> Any:
+    if isinstance(value, str):
+        # A bare "{name}" passes the argument through unchanged so numbers,
+        # booleans and lists keep their JSON type.
+        whole = _PLACEHOLDER.fullmatch(value)
+        if whole:
+            return arguments.get(whole.group(1))
+        return _PLACEHOLDER.sub(lambda m: str(arguments.get(m.group(1), "")), value)
+    if isinstance(value, dict):
+        return {k: _render_value(v, arguments) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_render_value(v, arguments) for v in value]
+    return value
+
+
+def _extract_path(data: Any, path: str | None) -> Any:
+    if not path:
+        return data
+    for part in path.split("."):
+        if isinstance(data, list) and part.isdigit():
+            index = int(part)
+            data = data[index] if index < len(data) else None
+        elif isinstance(data, dict):
+            data = data.get(part)
+        else:
+            return None
+    return data
+
+
+def build_http_handler(
+    settings: Settings,
+    name: str,
+    config: dict[str, Any],
+) -> Callable[[dict[str, Any]], Awaitable[str]]:
+    method = str(config.get("method", "GET")).upper()
+    url_template = config["url"]
+    query_template = config.get("query") or {}
+    body_template = config.get("body")
+    headers = {k: os.path.expandvars(str(v)) for k, v in (config.get("headers") or {}).items()}
+    response_path = config.get("response_path")
+
+    async def _handle(arguments: dict[str, Any]) -> str:
+        url = _render_url(url_template, arguments)
+        params = {k: v for k, v in _render_value(query_template, arguments).items() if v is not None}
+        kwargs: dict[str, Any] = {"headers": headers, "params": params}
+        if body_template is not None:
+            kwargs["json"] = _render_value(body_template, arguments)
+
+        # An unreachable tool host must not fail the whole reply; the model
+        # gets an error string, as with timeouts and HTTP error statuses.
+        try:
+            async with _host_semaphore(settings, url):
+                response = await send_with_retry(settings, get_client(settings), method, url, **kwargs)
+        except CircuitOpenError as exc:
+            raise ToolError(f"Tool '{name}' is temporarily unavailable") from exc
+        except httpx.HTTPError as exc:
+            raise ToolError(f"Tool '{name}' failed: {type(exc).__name__}") from exc
+
+        if response.status_code >= 500 or response.status_code == 429:
+            raise ToolError(f"Tool '{name}' failed with HTTP status {response.status_code}")
+        if response.status_code >= 400:
+            return f"Tool '{name}' failed with HTTP status {response.status_code}"
+        try:
+            data = response.json()
+        except ValueError:
+            return response.text[:_MAX_TEXT_RESULT]
+
+        result = _extract_path(data, response_path)
+        if isinstance(result, str):
+            return result
+        return json.dumps(result, ensure_ascii=False)
+
+    return _handle
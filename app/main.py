@@ -1,25 +1,74 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
-from typing import Any
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
 from dotenv import load_dotenv
 from fastapi import BackgroundTasks, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser.
+    from json import loads as _json_loads
 
 from .chatwoot import create_message, handoff_conversation, list_messages
-from .config import load_settings
-from .openai_client import generate_reply
+from .config import Settings, load_settings
+from .http_pool import close_clients
+from .memory import fold_history, history_limit, load_memory, summary_message, visible_messages
+from .metrics import (
+    PROCESS_SECONDS,
+    QUEUE_WAIT_SECONDS,
+    STAGE_SECONDS,
+    WEBHOOK_EVENTS,
+    WEBHOOK_SECONDS,
+    render as render_metrics,
+)
 from .prompting import load_system_prompt
 from .rag import retrieve_context
+from .routing import route_and_generate
+from .sharding import ShardDispatcher, submit as submit_to_shard
+from .state import close_backend, conversation_lock, get_backend
 from .tools import load_tools
+from .warmup import Readiness, prepare, warm_up
 
 load_dotenv()
 _log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=getattr(logging, _log_level, logging.INFO))
 logger = logging.getLogger("chatwoot-bot")
 
-app = FastAPI(title="Chatwoot Bot Webhook")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    settings = load_settings()
+    app.state.settings = settings
+    readiness = Readiness()
+    app.state.readiness = readiness
+    # Local resources (settings, prompt, tools, RAG index) must load before
+    # the app serves anything; upstream connections warm in the background
+    # while /health reports 503.
+    prepare(settings, readiness)
+    dispatcher = None
+    if settings.shard_count > 0:
+        dispatcher = ShardDispatcher(settings, get_backend(settings), _run_job)
+        dispatcher.start()
+    warmup = asyncio.create_task(warm_up(settings, readiness))
+    yield
+    warmup.cancel()
+    if dispatcher is not None:
+        await dispatcher.stop()
+    await close_clients()
+    await close_backend()
+
+
+app = FastAPI(title="Chatwoot Bot Webhook", lifespan=lifespan)
+
+# Strong references to fire-and-forget tasks so they are not collected mid-run.
+_background_tasks: set[asyncio.Task] = set()
 
 
 class HandoffRequested(Exception):
@@ -76,6 +125,36 @@ def _extract_conversation_id(payload: dict) -> int | None:
     return None
 
 
+def _extract_message_id(payload: dict) -> int | None:
+    if isinstance(payload.get("id"), int):
+        return payload.get("id")
+    message = payload.get("message") or {}
+    if isinstance(message.get("id"), int):
+        return message.get("id")
+    return None
+
+
+def _extract_inbox_id(payload: dict) -> int | None:
+    inbox = payload.get("inbox") or {}
+    if isinstance(inbox.get("id"), int):
+        return inbox.get("id")
+    if isinstance(payload.get("inbox_id"), int):
+        return payload.get("inbox_id")
+    conversation = payload.get("conversation") or {}
+    if isinstance(conversation.get("inbox_id"), int):
+        return conversation.get("inbox_id")
+    return None
+
+
+def _disallowed_source_reason(settings: Settings, payload: dict) -> str | None:
+    """Return an ignore reason when the payload is outside the configured allow-lists."""
+    if settings.webhook_account_ids and _extract_account_id(payload) not in settings.webhook_account_ids:
+        return "account_not_allowed"
+    if settings.webhook_inbox_ids and _extract_inbox_id(payload) not in settings.webhook_inbox_ids:
+        return "inbox_not_allowed"
+    return None
+
+
 def _is_sender_bot(payload: dict) -> bool:
     sender = payload.get("sender") or (payload.get("message") or {}).get("sender") or {}
     sender_type = sender.get("type")
@@ -90,24 +169,7 @@ def _is_bot_handled_conversation(payload: dict) -> bool:
 
 
 def _map_history_to_messages(history: list[dict], current_content: str) -> list[dict[str, str]]:
-    messages: list[dict[str, str]] = []
-
-    for item in sorted(history, key=lambda x: x.get("id") or 0):
-        if item.get("private") is True:
-            continue
-        content = (item.get("content") or "").strip()
-        if not content:
-            continue
-
-        sender_type = item.get("sender_type")
-        message_type = item.get("message_type")
-
-        if sender_type == "contact" or message_type in (0, "incoming"):
-            role = "user"
-        else:
-            role = "assistant"
-
-        messages.append({"role": role, "content": content})
+    messages = [{"role": role, "content": content} for _, role, content in visible_messages(history)]
 
     if current_content:
         if not messages or messages[-1]["role"] != "user" or messages[-1]["content"] != current_content:
@@ -116,12 +178,79 @@ def _map_history_to_messages(history: list[dict], current_content: str) -> list[
     return messages
 
 
+async def _is_superseded(settings: Settings, conversation_key: str, message_id: int) -> bool:
+    """Record ``message_id`` as the latest handled message unless a newer one already was."""
+    backend = get_backend(settings)
+    key = f"last_message:{conversation_key}"
+    last = await backend.get(key)
+    if last is not None and int(last) >= message_id:
+        return True
+    await backend.set(key, str(message_id), settings.dedup_ttl_seconds)
+    return False
+
+
 async def _process_message(
     account_id: int,
     conversation_id: int,
     content: str,
+    accepted_at: float | None = None,
+    message_id: int | None = None,
 ) -> None:
+    if accepted_at is not None:
+        QUEUE_WAIT_SECONDS.observe(max(0.0, time.time() - accepted_at))
     settings = load_settings()
+    conversation_key = f"{account_id}:{conversation_id}"
+
+    try:
+        # One reply at a time per conversation across all workers. A message
+        # older than one already answered is skipped: that reply was generated
+        # from history which included it.
+        async with conversation_lock(
+            get_backend(settings),
+            f"lock:conversation:{conversation_key}",
+            settings.conversation_lock_seconds,
+        ):
+            if message_id is not None and await _is_superseded(settings, conversation_key, message_id):
+                logger.info(
+                    "Skipping superseded message: account_id=%s conversation_id=%s message_id=%s",
+                    account_id,
+                    conversation_id,
+                    message_id,
+                )
+                return
+            to_fold = await _answer_message(settings, account_id, conversation_id, content)
+    except Exception:
+        logger.exception("Failed to coordinate Chatwoot message: account_id=%s conversation_id=%s", account_id, conversation_id)
+        return
+
+    if to_fold is not None:
+        # Outside the conversation lock, so summarizing never delays the
+        # reply to the customer's next message.
+        task = asyncio.create_task(_update_summary(settings, conversation_key, to_fold))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+async def _update_summary(settings: Settings, conversation_key: str, history: list[dict]) -> None:
+    try:
+        await fold_history(settings, get_backend(settings), conversation_key, history)
+    except Exception:
+        logger.exception("Failed to update conversation summary: conversation=%s", conversation_key)
+
+
+async def _run_job(job: dict[str, Any]) -> None:
+    await _process_message(**job)
+
+
+async def _answer_message(
+    settings: Settings,
+    account_id: int,
+    conversation_id: int,
+    content: str,
+) -> list[dict] | None:
+    """Reply to ``content``; returns the history still to be summarized, if any."""
+    started = time.perf_counter()
+    outcome = "error"
 
     async def request_handoff(arguments: dict[str, Any]) -> str:
         await handoff_conversation(
@@ -134,8 +263,10 @@ async def _process_message(
         raise HandoffRequested(arguments.get("reason", ""))
 
     try:
-        history = await list_messages(settings, account_id, conversation_id, settings.history_messages)
-        system_prompt = load_system_prompt(settings)
+        with STAGE_SECONDS.labels("history").time():
+            history = await list_messages(settings, account_id, conversation_id, history_limit(settings))
+        with STAGE_SECONDS.labels("prompt").time():
+            system_prompt = load_system_prompt(settings)
         if settings.handoff_enabled:
             system_prompt += (
                 "\n\n有人対応への引き継ぎルール：ユーザーが人間の担当者やオペレーターとの対応を明確に希望した場合、"
@@ -147,6 +278,13 @@ async def _process_message(
             rag = await retrieve_context(settings, content)
             if rag.context:
                 llm_messages.append({"role": "system", "content": rag.context})
+        memory = None
+        if settings.summary_enabled:
+            memory = await load_memory(get_backend(settings), f"{account_id}:{conversation_id}", history)
+            summary = summary_message(memory)
+            if summary:
+                llm_messages.append(summary)
+            history = memory.unsummarized
         llm_messages.extend(_map_history_to_messages(history, content))
 
         tools = None
@@ -158,38 +296,85 @@ async def _process_message(
                 handoff_only=not settings.tools_enabled,
             )
 
-        reply = await generate_reply(settings, llm_messages, tools=tools, tool_handlers=tool_handlers)
-        await create_message(settings, account_id, conversation_id, reply)
+        with STAGE_SECONDS.labels("llm").time():
+            reply = await route_and_generate(settings, content, llm_messages, tools=tools, tool_handlers=tool_handlers)
+        with STAGE_SECONDS.labels("send_reply").time():
+            await create_message(settings, account_id, conversation_id, reply)
+        outcome = "replied"
+        return memory.unsummarized if memory is not None else None
     except HandoffRequested:
+        outcome = "handoff"
         logger.info("Conversation handed off to a human: account_id=%s conversation_id=%s", account_id, conversation_id)
-        return
+        return None
     except Exception:
         logger.exception("Failed to process Chatwoot message: account_id=%s conversation_id=%s", account_id, conversation_id)
-        return
+        return None
+    finally:
+        PROCESS_SECONDS.labels(outcome).observe(time.perf_counter() - started)
+
+
+def _readiness() -> Readiness | None:
+    return getattr(app.state, "readiness", None)
 
 
 @app.get("/health")
-async def health() -> dict[str, str]:
-    return {"status": "ok"}
+async def health() -> JSONResponse:
+    readiness = _readiness()
+    if readiness is not None and not readiness.warm:
+        return JSONResponse({"status": "warming_up"}, status_code=503)
+    return JSONResponse({"status": "ok"})
 
 
-@app.post("/webhook/chatwoot")
-async def chatwoot_webhook(request: Request, background_tasks: BackgroundTasks) -> dict[str, Any]:
-    payload = await request.json()
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    readiness = _readiness()
+    if readiness is None:
+        return JSONResponse({"ready": False, "warm": False, "checks": {}}, status_code=503)
+    return JSONResponse(readiness.as_dict(), status_code=200 if readiness.ready else 503)
+
+
+@app.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+async def _accept_webhook(request: Request, background_tasks: BackgroundTasks) -> dict[str, Any]:
+    body = await request.body()
+    # Only message_created events are handled. Checking the raw bytes skips
+    # decoding conversation_updated, typing and other high-volume events.
+    if b"message_created" not in body:
+        logger.debug("Webhook event ignored before decoding")
+        return {"ignored": True, "reason": "unsupported_event"}
+
+    try:
+        payload = _json_loads(body)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload") from exc
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+
     logger.info("Webhook event received: %s", payload.get("event"))
-    logger.debug(
-        "payload keys=%s inbox=%s contact=%s conversation=%s message=%s sender=%s",
-        list(payload.keys()),
-        payload.get("inbox"),
-        payload.get("contact"),
-        payload.get("conversation"),
-        payload.get("message"),
-        payload.get("sender"),
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "payload keys=%s inbox=%s contact=%s conversation=%s message=%s sender=%s",
+            list(payload.keys()),
+            payload.get("inbox"),
+            payload.get("contact"),
+            payload.get("conversation"),
+            payload.get("message"),
+            payload.get("sender"),
+        )
 
     if payload.get("event") != "message_created":
         return {"ignored": True, "reason": "unsupported_event"}
 
+    settings: Settings | None = getattr(request.app.state, "settings", None)
+    if settings is None:
+        settings = request.app.state.settings = load_settings()
+    ignored_source = _disallowed_source_reason(settings, payload)
+    if ignored_source:
+        return {"ignored": True, "reason": ignored_source}
+
     if _is_private(payload):
         return {"ignored": True, "reason": "private_message"}
 
@@ -216,6 +401,37 @@ async def chatwoot_webhook(request: Request, background_tasks: BackgroundTasks)
     if missing:
         raise HTTPException(status_code=400, detail=f"Missing identifiers: {', '.join(missing)}")
 
-    background_tasks.add_task(_process_message, account_id, conversation_id, content)
+    backend = get_backend(settings)
+    message_id = _extract_message_id(payload)
+    if message_id is not None and not await backend.claim(
+        f"webhook:{account_id}:{message_id}", settings.dedup_ttl_seconds
+    ):
+        return {"ignored": True, "reason": "duplicate"}
+
+    job = {
+        "account_id": account_id,
+        "conversation_id": conversation_id,
+        "content": content,
+        "accepted_at": time.time(),
+        "message_id": message_id,
+    }
+    if settings.shard_count > 0:
+        await submit_to_shard(backend, settings, conversation_id, job)
+    else:
+        background_tasks.add_task(_process_message, **job)
 
     return {"ok": True, "accepted": True}
+
+
+@app.post("/webhook/chatwoot")
+async def chatwoot_webhook(request: Request, background_tasks: BackgroundTasks) -> dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        result = await _accept_webhook(request, background_tasks)
+    except HTTPException:
+        WEBHOOK_EVENTS.labels("invalid").inc()
+        raise
+    finally:
+        WEBHOOK_SECONDS.observe(time.perf_counter() - started)
+    WEBHOOK_EVENTS.labels(result.get("reason", "accepted")).inc()
+    return result
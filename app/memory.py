@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+
+from .config import Settings
+from .metrics import STAGE_SECONDS
+from .openai_client import generate_reply
+from .state import StateBackend, conversation_lock
+
+logger = logging.getLogger("chatwoot-bot")
+
+_SUMMARY_INSTRUCTIONS = (
+    "あなたはカスタマーサポート会話の要約担当です。既存の要約に新しいメッセージの内容を統合し、"
+    "顧客の要望・状況、提供済みの情報、未解決の事項、約束した対応を簡潔な箇条書きで更新してください。"
+    "会話と同じ言語で、{max_chars}文字以内で出力してください。要約以外の文章は出力しないでください。"
+)
+
+
+@dataclass(frozen=True)
+class ConversationMemory:
+    """The stored summary and the raw messages that still go into the prompt."""
+
+    summary: str
+    through_id: int
+    unsummarized: list[dict]
+
+
+def visible_messages(history: list[dict]) -> list[tuple[int, str, str]]:
+    """Public, non-empty messages as ``(id, role, content)``, oldest first."""
+    messages = []
+    for item in sorted(history, key=lambda x: x.get("id") or 0):
+        if item.get("private") is True:
+            continue
+        content = (item.get("content") or "").strip()
+        if not content:
+            continue
+        if item.get("sender_type") == "contact" or item.get("message_type") in (0, "incoming"):
+            role = "user"
+        else:
+            role = "assistant"
+        messages.append((item.get("id") or 0, role, content))
+    return messages
+
+
+def history_limit(settings: Settings) -> int:
+    """How many recent Chatwoot messages to fetch per turn."""
+    if not settings.summary_enabled:
+        return settings.history_messages
+    # Room for the verbatim tail plus a full batch waiting to be folded, with
+    # slack so a burst of messages between turns is not skipped.
+    return settings.summary_recent_messages + 2 * settings.summary_trigger_messages
+
+
+def _summary_key(conversation_key: str) -> str:
+    return f"summary:{conversation_key}"
+
+
+async def load_memory(backend: StateBackend, conversation_key: str, history: list[dict]) -> ConversationMemory:
+    raw = await backend.get(_summary_key(conversation_key))
+    summary, through_id = "", 0
+    if raw:
+        data = json.loads(raw)
+        summary, through_id = data.get("summary", ""), int(data.get("through_id", 0))
+    unsummarized = [item for item in history if (item.get("id") or 0) > through_id]
+    return ConversationMemory(summary=summary, through_id=through_id, unsummarized=unsummarized)
+
+
+def summary_message(memory: ConversationMemory) -> dict[str, str] | None:
+    if not memory.summary:
+        return None
+    return {"role": "system", "content": f"これまでの会話の要約:\n{memory.summary}"}
+
+
+async def fold_history(
+    settings: Settings,
+    backend: StateBackend,
+    conversation_key: str,
+    history: list[dict],
+) -> None:
+    """Fold older unsummarized messages of ``history`` into the stored summary.
+
+    Only runs once at least ``summary_trigger_messages`` messages sit outside
+    the verbatim tail, so the summary is extended in batches from its previous
+    version rather than rebuilt from the whole thread each turn. Folds take a
+    summary lock of their own, not the conversation lock, so replies to the
+    next message never wait for one; the stored summary is re-read under that
+    lock so concurrent folds never overlap.
+    """
+    async with conversation_lock(backend, f"lock:{_summary_key(conversation_key)}", settings.conversation_lock_seconds):
+        await _fold(settings, backend, conversation_key, await load_memory(backend, conversation_key, history))
+
+
+async def _fold(settings: Settings, backend: StateBackend, conversation_key: str, memory: ConversationMemory) -> None:
+    messages = visible_messages(memory.unsummarized)
+    older = messages[: max(0, len(messages) - settings.summary_recent_messages)]
+    if not older or len(older) < settings.summary_trigger_messages:
+        return
+
+    transcript = "\n".join(f"{'顧客' if role == 'user' else '担当'}: {content}" for _, role, content in older)
+    prompt = [
+        {"role": "system", "content": _SUMMARY_INSTRUCTIONS.format(max_chars=settings.summary_max_chars)},
+        {"role": "user", "content": f"既存の要約:\n{memory.summary or '（なし）'}\n\n新しいメッセージ:\n{transcript}"},
+    ]
+    with STAGE_SECONDS.labels("summary").time():
+        summary = await generate_reply(
+            settings,
+            prompt,
+            model=settings.summary_model or settings.openai_fast_model or None,
+        )
+    summary = summary.strip()[: settings.summary_max_chars]
+    await backend.set(
+        _summary_key(conversation_key),
+        json.dumps({"summary": summary, "through_id": older[-1][0]}, ensure_ascii=False),
+        settings.summary_ttl_seconds,
+    )
+    logger.debug("Folded %s messages into summary for conversation %s", len(older), conversation_key)
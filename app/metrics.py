@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+# Dependency-free subset of the Prometheus client: counters, gauges and
+# histograms rendered in the text exposition format. Updates are plain
+# attribute arithmetic so they are cheap enough for the request hot path.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Sample = tuple[str, dict[str, str], float]
+
+_registry: list["_Metric"] = []
+_collectors: list[Callable[[], Iterable[tuple[str, str, str, list[Sample]]]]] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_sample(name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+        return f"{name}{{{rendered}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    @abstractmethod
+    def _new_child(self) -> object:
+        ...
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._new_child()
+            self._children[values] = child
+        return child
+
+    def samples(self) -> list[Sample]:
+        return [
+            (self.name, dict(zip(self.labelnames, key)), child.value)
+            for key, child in self._children.items()
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self) -> list[Sample]:
+        output: list[Sample] = []
+        for key, child in self._children.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                output.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            output.append((f"{self.name}_sum", labels, child.sum))
+            output.append((f"{self.name}_count", labels, child.count))
+        return output
+
+
+def register_collector(collector: Callable[[], Iterable[tuple[str, str, str, list[Sample]]]]) -> None:
+    """Register a callback yielding ``(name, kind, help, samples)`` at scrape time."""
+    _collectors.append(collector)
+
+
+def render() -> str:
+    families = [(m.name, m.kind, m.documentation, m.samples()) for m in _registry]
+    for collector in _collectors:
+        families.extend(collector())
+
+    lines: list[str] = []
+    for name, kind, documentation, samples in families:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(_format_sample(n, labels, value) for n, labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "bot_stage_seconds",
+    "Latency of each stage of processing a Chatwoot message.",
+    ("stage",),
+)
+PROCESS_SECONDS = Histogram(
+    "bot_process_seconds",
+    "End-to-end time to process a Chatwoot message in the background.",
+    ("outcome",),
+)
+WEBHOOK_SECONDS = Histogram(
+    "bot_webhook_accept_seconds",
+    "Time spent in the webhook handler before acknowledging Chatwoot.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+WEBHOOK_EVENTS = Counter(
+    "bot_webhook_events_total",
+    "Webhook events by acceptance result.",
+    ("result",),
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "bot_queue_wait_seconds",
+    "Delay between accepting a webhook and starting to process it.",
+)
+HTTP_IN_FLIGHT = Gauge(
+    "bot_http_requests_in_flight",
+    "Outbound HTTP requests currently using a pooled connection, per host.",
+    ("host",),
+)
+HTTP_REQUESTS = Counter(
+    "bot_http_requests_total",
+    "Outbound HTTP request attempts per host and status.",
+    ("host", "status"),
+)
+LLM_TOKENS = Counter(
+    "bot_llm_tokens_total",
+    "LLM token usage reported by the provider.",
+    ("model", "kind"),
+)
+RAG_QUERIES = Counter(
+    "bot_rag_queries_total",
+    "RAG retrievals performed.",
+)
+RAG_HITS = Counter(
+    "bot_rag_hits_total",
+    "Documents returned by RAG retrievals.",
+)
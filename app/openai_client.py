@@ -1,10 +1,24 @@
 from __future__ import annotations
 
+import asyncio
+import codecs
 import httpx
 import json
+import re
+from dataclasses import dataclass
 from typing import Any
 
 from .config import Settings
+from .http_pool import get_client
+from .metrics import LLM_TOKENS
+from .resilience import send_with_retry
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional; fall back to the stdlib parser.
+    from json import loads as _json_loads
+
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
 
 
 def _headers(settings: Settings) -> dict:
@@ -20,47 +34,151 @@ def _tool_choice(settings: Settings) -> str | dict | None:
     return {"type": "function", "function": {"name": settings.tool_choice}}
 
 
-def _parse_sse_chat_completion(body_text: str) -> dict:
-    choice_states: dict[int, dict[str, Any]] = {}
-    first_chunk: dict[str, Any] | None = None
-
-    for raw_line in body_text.splitlines():
-        line = raw_line.strip()
-        if not line.startswith("data:"):
-            continue
-        payload = line[5:].strip()
-        if not payload:
-            continue
-        if payload == "[DONE]":
-            break
-
-        chunk = json.loads(payload)
-        if first_chunk is None:
-            first_chunk = chunk
+@dataclass(slots=True)
+class SseEvent:
+    data: str
+    event: str | None = None
+    id: str | None = None
+
+
+class SseDecoder:
+    """Incremental server-sent events decoder over raw byte chunks.
+
+    Handles ``\n``, ``\r\n`` and ``\r`` line endings split across chunks,
+    multi-line ``data:`` fields and the ``event:``/``id:`` fields.
+    """
+
+    def __init__(self) -> None:
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+        self._data: list[str] = []
+        self._event: str | None = None
+        self._id: str | None = None
+
+    def feed(self, chunk: bytes) -> list[SseEvent]:
+        return self._feed_text(self._decoder.decode(chunk))
+
+    def flush(self) -> list[SseEvent]:
+        """Decode any trailing bytes and dispatch an event left without a blank line."""
+        events = self._feed_text(self._decoder.decode(b"", final=True))
+        if self._pending:
+            self._process_line(self._pending.rstrip("\r"), events)
+            self._pending = ""
+        self._dispatch(events)
+        return events
+
+    def _feed_text(self, text: str) -> list[SseEvent]:
+        events: list[SseEvent] = []
+        if not text:
+            return events
+        text = self._pending + text
+        # A trailing "\r" may be the first half of a "\r\n" split across chunks.
+        carry = ""
+        if text.endswith("\r"):
+            text, carry = text[:-1], "\r"
+        lines = _LINE_BREAK.split(text)
+        self._pending = lines.pop() + carry
+        # "data:" and blank lines dominate real streams, so they are handled
+        # inline; other fields go through _process_line.
+        data = self._data
+        for line in lines:
+            if line.startswith("data:"):
+                data.append(line[6:] if line.startswith("data: ") else line[5:])
+            elif not line:
+                self._dispatch(events)
+            else:
+                self._process_line(line, events)
+        return events
+
+    def _process_line(self, line: str, events: list[SseEvent]) -> None:
+        if not line:
+            self._dispatch(events)
+            return
+        if line.startswith(":"):
+            return
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            self._id = value
+
+    def _dispatch(self, events: list[SseEvent]) -> None:
+        if self._data:
+            events.append(SseEvent("\n".join(self._data), self._event, self._id))
+            self._data.clear()
+        self._event = None
+
+
+class ChatCompletionAccumulator:
+    """Folds streamed ``chat.completion.chunk`` deltas into one completion.
+
+    Content and tool-call arguments are collected in lists and joined once
+    at the end, so long outputs stay linear.
+    """
+
+    def __init__(self) -> None:
+        self.done = False
+        self._first_chunk: dict[str, Any] | None = None
+        self._usage: dict[str, Any] | None = None
+        self._choices: dict[int, dict[str, Any]] = {}
+
+    def add_event(self, event: SseEvent) -> None:
+        if self.done:
+            return
+        if event.event is not None and event.event != "message":
+            if event.event == "error":
+                raise RuntimeError(f"Chat completion stream error: {event.data[:300]}")
+            return
+        payload = event.data
+        if payload == "[DONE]" or payload.strip() == "[DONE]":
+            self.done = True
+            return
+        if not payload.strip():
+            return
+        try:
+            chunk = _json_loads(payload)
+        except ValueError:
+            # Some proxies emit consecutive "data:" lines without the blank
+            # separator line; treat each line as its own chunk.
+            for line in payload.split("\n"):
+                line = line.strip()
+                if line == "[DONE]":
+                    self.done = True
+                    return
+                if line:
+                    self.add_chunk(_json_loads(line))
+            return
+        self.add_chunk(chunk)
+
+    def add_chunk(self, chunk: dict[str, Any]) -> None:
+        if self._first_chunk is None:
+            self._first_chunk = chunk
+        if chunk.get("usage"):
+            self._usage = chunk["usage"]
 
         for choice in chunk.get("choices") or []:
             idx = int(choice.get("index", 0))
-            state = choice_states.setdefault(
-                idx,
-                {
-                    "message": {"role": "assistant", "content": ""},
-                    "tool_calls": {},
-                    "finish_reason": None,
-                },
-            )
+            state = self._choices.get(idx)
+            if state is None:
+                state = {"role": "assistant", "content": [], "tool_calls": {}, "finish_reason": None}
+                self._choices[idx] = state
 
             delta = choice.get("delta") or {}
             if isinstance(delta.get("role"), str):
-                state["message"]["role"] = delta["role"]
+                state["role"] = delta["role"]
             if isinstance(delta.get("content"), str):
-                state["message"]["content"] += delta["content"]
+                state["content"].append(delta["content"])
 
             for tc in delta.get("tool_calls") or []:
                 tc_idx = int(tc.get("index", 0))
-                tc_state = state["tool_calls"].setdefault(
-                    tc_idx,
-                    {"type": "function", "id": "", "function": {"name": "", "arguments": ""}},
-                )
+                tc_state = state["tool_calls"].get(tc_idx)
+                if tc_state is None:
+                    tc_state = {"type": "function", "id": "", "name": "", "arguments": []}
+                    state["tool_calls"][tc_idx] = tc_state
                 if isinstance(tc.get("id"), str):
                     tc_state["id"] = tc["id"]
                 if isinstance(tc.get("type"), str):
@@ -68,47 +186,98 @@ def _parse_sse_chat_completion(body_text: str) -> dict:
 
                 fn = tc.get("function") or {}
                 if isinstance(fn.get("name"), str):
-                    tc_state["function"]["name"] = fn["name"]
+                    tc_state["name"] = fn["name"]
                 if isinstance(fn.get("arguments"), str):
-                    tc_state["function"]["arguments"] += fn["arguments"]
+                    tc_state["arguments"].append(fn["arguments"])
 
             if choice.get("finish_reason") is not None:
                 state["finish_reason"] = choice.get("finish_reason")
 
-    if first_chunk is None:
-        raise ValueError("empty SSE body")
-
-    choices: list[dict[str, Any]] = []
-    for idx in sorted(choice_states.keys()):
-        state = choice_states[idx]
-        message = state["message"]
-        tool_calls = [state["tool_calls"][k] for k in sorted(state["tool_calls"].keys())]
-        if tool_calls:
-            message["tool_calls"] = tool_calls
-        choices.append(
-            {
-                "index": idx,
-                "message": message,
-                "finish_reason": state["finish_reason"],
-            }
-        )
+    def result(self) -> dict:
+        if self._first_chunk is None:
+            raise ValueError("empty SSE body")
 
-    return {
-        "id": first_chunk.get("id"),
-        "object": "chat.completion",
-        "created": first_chunk.get("created"),
-        "model": first_chunk.get("model"),
-        "choices": choices,
-    }
+        choices: list[dict[str, Any]] = []
+        for idx in sorted(self._choices):
+            state = self._choices[idx]
+            message: dict[str, Any] = {"role": state["role"], "content": "".join(state["content"])}
+            tool_calls = [
+                {
+                    "type": tc["type"],
+                    "id": tc["id"],
+                    "function": {"name": tc["name"], "arguments": "".join(tc["arguments"])},
+                }
+                for _, tc in sorted(state["tool_calls"].items())
+            ]
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            choices.append({"index": idx, "message": message, "finish_reason": state["finish_reason"]})
+
+        result = {
+            "id": self._first_chunk.get("id"),
+            "object": "chat.completion",
+            "created": self._first_chunk.get("created"),
+            "model": self._first_chunk.get("model"),
+            "choices": choices,
+        }
+        if self._usage is not None:
+            result["usage"] = self._usage
+        return result
+
+
+def _parse_sse_chat_completion(body_text: str) -> dict:
+    decoder = SseDecoder()
+    accumulator = ChatCompletionAccumulator()
+    for event in decoder.feed(body_text.encode("utf-8")) + decoder.flush():
+        accumulator.add_event(event)
+        if accumulator.done:
+            break
+    return accumulator.result()
+
+
+async def _read_sse_chat_completion(response: httpx.Response) -> dict:
+    decoder = SseDecoder()
+    accumulator = ChatCompletionAccumulator()
+
+    def add(event: SseEvent) -> None:
+        try:
+            accumulator.add_event(event)
+        except ValueError as exc:
+            preview = event.data.strip().replace("\n", " ")[:300]
+            content_type = response.headers.get("content-type", "")
+            raise RuntimeError(
+                "Chat completion returned non-JSON response "
+                f"(status={response.status_code}, content_type={content_type!r}, body_preview={preview!r})"
+            ) from exc
+
+    async for chunk in response.aiter_bytes():
+        for event in decoder.feed(chunk):
+            add(event)
+        if accumulator.done:
+            return accumulator.result()
+    for event in decoder.flush():
+        add(event)
+    return accumulator.result()
 
 
 async def _chat_completion(
     settings: Settings,
     payload: dict,
 ) -> dict:
-    timeout = httpx.Timeout(settings.request_timeout_seconds)
-    async with httpx.AsyncClient(base_url=settings.openai_base_url, timeout=timeout) as client:
-        response = await client.post("/chat/completions", headers=_headers(settings), json=payload)
+    client = get_client(settings, settings.openai_base_url)
+    response = await send_with_retry(
+        settings,
+        client,
+        "POST",
+        "/chat/completions",
+        headers=_headers(settings),
+        json=payload,
+        stream=True,
+        idempotent=True,
+    )
+    try:
+        if response.status_code >= 400:
+            await response.aread()
         try:
             response.raise_for_status()
         except httpx.HTTPStatusError as exc:
@@ -117,12 +286,15 @@ async def _chat_completion(
                 f"Chat completion request failed ({response.status_code} {response.reason_phrase}): {details}"
             ) from exc
         content_type = response.headers.get("content-type", "")
+        if "text/event-stream" in content_type.lower():
+            return await _read_sse_chat_completion(response)
+
+        await response.aread()
         body_text = response.text or ""
         try:
             return response.json()
         except ValueError as exc:
-            is_sse = "text/event-stream" in content_type.lower() or body_text.lstrip().startswith("data:")
-            if is_sse:
+            if body_text.lstrip().startswith("data:"):
                 try:
                     return _parse_sse_chat_completion(body_text)
                 except Exception:
@@ -132,6 +304,44 @@ async def _chat_completion(
                 "Chat completion returned non-JSON response "
                 f"(status={response.status_code}, content_type={content_type!r}, body_preview={preview!r})"
             ) from exc
+    finally:
+        await response.aclose()
+
+
+async def _run_tool_call(call: dict, tool_handlers: dict) -> str:
+    name = call.get("function", {}).get("name")
+    arguments = call.get("function", {}).get("arguments")
+    try:
+        if isinstance(arguments, str):
+            parsed_args = json.loads(arguments)
+        elif isinstance(arguments, dict):
+            parsed_args = arguments
+        else:
+            parsed_args = {}
+    except Exception:
+        parsed_args = {}
+
+    handler = tool_handlers.get(name)
+    if handler:
+        return await handler(parsed_args)
+    return f"Tool '{name}' is not available"
+
+
+class EscalationRequested(Exception):
+    """Raised when the model calls a tool listed in ``escalate_on``; the tool is not executed."""
+
+
+def _add_usage(total: dict[str, int], usage: dict | None) -> None:
+    for key, value in (usage or {}).items():
+        if isinstance(value, int):
+            total[key] = total.get(key, 0) + value
+
+
+def _record_usage(model: str, usage: dict | None) -> None:
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = (usage or {}).get(kind)
+        if isinstance(value, int):
+            LLM_TOKENS.labels(model, kind.removesuffix("_tokens")).inc(value)
 
 
 async def generate_reply(
@@ -139,12 +349,15 @@ async def generate_reply(
     messages: list[dict],
     tools: list[dict] | None = None,
     tool_handlers: dict | None = None,
+    model: str | None = None,
+    escalate_on: set[str] | None = None,
+    usage: dict[str, int] | None = None,
 ) -> str:
     tool_handlers = tool_handlers or {}
 
     for _ in range(max(1, settings.max_tool_rounds)):
         payload = {
-            "model": settings.openai_model,
+            "model": model or settings.openai_model,
             "messages": messages,
             "temperature": 0.7,
             "stream": False,
@@ -154,6 +367,9 @@ async def generate_reply(
             payload["tool_choice"] = _tool_choice(settings)
 
         data = await _chat_completion(settings, payload)
+        _record_usage(payload["model"], data.get("usage"))
+        if usage is not None:
+            _add_usage(usage, data.get("usage"))
         choice = (data.get("choices") or [{}])[0]
         message = choice.get("message") or {}
         tool_calls = message.get("tool_calls") or []
@@ -164,27 +380,22 @@ async def generate_reply(
                 raise RuntimeError("OpenRouter returned empty content")
             return content
 
+        if escalate_on and any(call.get("function", {}).get("name") in escalate_on for call in tool_calls):
+            raise EscalationRequested(model or settings.openai_model)
+
         messages.append(message)
 
-        for call in tool_calls:
-            name = call.get("function", {}).get("name")
-            arguments = call.get("function", {}).get("arguments")
-            try:
-                if isinstance(arguments, str):
-                    parsed_args = json.loads(arguments)
-                elif isinstance(arguments, dict):
-                    parsed_args = arguments
-                else:
-                    parsed_args = {}
-            except Exception:
-                parsed_args = {}
-
-            handler = tool_handlers.get(name)
-            if handler:
-                result = await handler(parsed_args)
-            else:
-                result = f"Tool '{name}' is not available"
+        # Calls from one round are independent, so run them concurrently and
+        # append the results in the order the model issued them.
+        results = await asyncio.gather(
+            *(_run_tool_call(call, tool_handlers) for call in tool_calls),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
 
+        for call, result in zip(tool_calls, results):
             messages.append(
                 {
                     "role": "tool",
@@ -201,18 +412,18 @@ async def embed_texts(settings: Settings, texts: list[str]) -> list[list[float]]
         "model": settings.openai_embed_model,
         "input": texts,
     }
-    timeout = httpx.Timeout(settings.request_timeout_seconds)
-
-    async with httpx.AsyncClient(base_url=settings.openai_base_url, timeout=timeout) as client:
-        response = await client.post("/embeddings", headers=_headers(settings), json=payload)
-        try:
-            response.raise_for_status()
-        except httpx.HTTPStatusError as exc:
-            details = response.text.strip()
-            raise RuntimeError(
-                f"Embedding request failed ({response.status_code} {response.reason_phrase}): {details}"
-            ) from exc
-        data = response.json()
+    client = get_client(settings, settings.openai_base_url)
+    response = await send_with_retry(
+        settings, client, "POST", "/embeddings", headers=_headers(settings), json=payload, idempotent=True
+    )
+    try:
+        response.raise_for_status()
+    except httpx.HTTPStatusError as exc:
+        details = response.text.strip()
+        raise RuntimeError(
+            f"Embedding request failed ({response.status_code} {response.reason_phrase}): {details}"
+        ) from exc
+    data = response.json()
 
     items = data.get("data") or []
     items.sort(key=lambda x: x.get("index", 0))
@@ -4,16 +4,33 @@ from pathlib import Path
 
 from .config import Settings
 
+_files: dict[str, tuple[int, str]] = {}
+
+
+def _read_file(name: str) -> str:
+    """Stripped file contents, re-read only when the file's mtime changes."""
+    path = Path(name)
+    try:
+        if not path.is_file():
+            return ""
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return ""
+    cached = _files.get(name)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    content = path.read_text(encoding="utf-8").strip()
+    _files[name] = (mtime, content)
+    return content
+
 
 def load_system_prompt(settings: Settings) -> str:
     prompt = settings.system_prompt
 
     if settings.system_prompt_path:
-        path = Path(settings.system_prompt_path)
-        if path.exists() and path.is_file():
-            content = path.read_text(encoding="utf-8").strip()
-            if content:
-                prompt = content
+        content = _read_file(settings.system_prompt_path)
+        if content:
+            prompt = content
 
     fallback_language = (settings.default_response_language or "ja").strip().lower()
     if fallback_language == "ja":
@@ -33,11 +50,9 @@ def load_system_prompt(settings: Settings) -> str:
     ]
 
     if settings.knowledge_path:
-        knowledge_path = Path(settings.knowledge_path)
-        if knowledge_path.exists() and knowledge_path.is_file():
-            knowledge = knowledge_path.read_text(encoding="utf-8").strip()
-            if knowledge:
-                parts.append("以下は社内ナレッジです。回答時に最優先で参照してください。")
-                parts.append(knowledge)
+        knowledge = _read_file(settings.knowledge_path)
+        if knowledge:
+            parts.append("以下は社内ナレッジです。回答時に最優先で参照してください。")
+            parts.append(knowledge)
 
     return "\n\n".join(part for part in parts if part)
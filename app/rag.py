@@ -1,11 +1,23 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
 
 from .config import Settings
+from .metrics import RAG_HITS, RAG_QUERIES, STAGE_SECONDS
 from .openai_client import embed_texts
 from .rag_store import RagDocument, RagStore
 
+logger = logging.getLogger("chatwoot-bot")
+
+# A store file modified this recently may still be being written by
+# app.ingest; wait for it to settle before reloading.
+_RELOAD_SETTLE_SECONDS = 2.0
+
 
 @dataclass(frozen=True)
 class RagResult:
@@ -35,8 +47,111 @@ def _sources(docs: list[RagDocument]) -> list[dict]:
     return output
 
 
+_store: RagStore | None = None
+_store_mtime: float | None = None
+_failed_mtime: float | None = None
+_reload: asyncio.Task | None = None
+_embeddings: OrderedDict[str, list[float]] = OrderedDict()
+
+
+def _file_mtime(settings: Settings) -> float | None:
+    try:
+        return os.path.getmtime(settings.rag_store_path)
+    except OSError:
+        return None
+
+
+def _build_store(settings: Settings) -> RagStore:
+    store = RagStore(settings.rag_store_path, settings.rag_quantization, settings.rag_rerank_candidates)
+    store.load()
+    return store
+
+
+def get_store(settings: Settings) -> RagStore:
+    """The store currently served by this worker, loading it on first use."""
+    global _store, _store_mtime
+    if _store is None:
+        _store_mtime = _file_mtime(settings)
+        _store = _build_store(settings)
+    return _store
+
+
+async def _reload_store(settings: Settings, mtime: float | None) -> None:
+    global _store, _store_mtime, _failed_mtime
+    try:
+        store = await asyncio.to_thread(_build_store, settings)
+    except Exception:
+        logger.exception("Failed to reload RAG store %s; keeping the previous index", settings.rag_store_path)
+        _failed_mtime = mtime
+        return
+    _store, _store_mtime = store, mtime
+    logger.info("Reloaded RAG store %s: %s chunks", settings.rag_store_path, len(store))
+
+
+async def current_store(settings: Settings) -> RagStore:
+    """The served store; a changed store file is reloaded off the event loop.
+
+    The previous index keeps answering queries until the new one is built,
+    and stays in place if the new file fails to load.
+    """
+    global _store, _store_mtime, _reload
+    if _store is None:
+        mtime = _file_mtime(settings)
+        store = await asyncio.to_thread(_build_store, settings)
+        if _store is None:
+            _store, _store_mtime = store, mtime
+        return _store
+    mtime = _file_mtime(settings)
+    if (
+        mtime != _store_mtime
+        and mtime != _failed_mtime
+        and (mtime is None or time.time() - mtime >= _RELOAD_SETTLE_SECONDS)
+        and (_reload is None or _reload.done())
+    ):
+        _reload = asyncio.create_task(_reload_store(settings, mtime))
+    return _store
+
+
+def _cache_key(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def _remember(settings: Settings, text: str, embedding: list[float]) -> None:
+    _embeddings[_cache_key(text)] = embedding
+    _embeddings.move_to_end(_cache_key(text))
+    while len(_embeddings) > settings.rag_embed_cache_size:
+        _embeddings.popitem(last=False)
+
+
+async def embed_questions(settings: Settings, questions: list[str], batch_size: int = 64) -> int:
+    """Embed ``questions`` into the query cache; returns the embedding dimension."""
+    dim = 0
+    for start in range(0, len(questions), batch_size):
+        batch = questions[start:start + batch_size]
+        for text, embedding in zip(batch, await embed_texts(settings, batch)):
+            _remember(settings, text, embedding)
+            dim = len(embedding)
+    return dim
+
+
+async def _embed_question(settings: Settings, question: str) -> list[float]:
+    if settings.rag_embed_cache_size <= 0:
+        return (await embed_texts(settings, [question]))[0]
+    cached = _embeddings.get(_cache_key(question))
+    if cached is not None:
+        _embeddings.move_to_end(_cache_key(question))
+        return cached
+    embedding = (await embed_texts(settings, [question]))[0]
+    _remember(settings, question, embedding)
+    return embedding
+
+
 async def retrieve_context(settings: Settings, question: str) -> RagResult:
-    store = RagStore(settings.rag_store_path)
-    query_embedding = await embed_texts(settings, [question])
-    docs = store.query(query_embedding[0], settings.rag_top_k)
+    store = await current_store(settings)
+    with STAGE_SECONDS.labels("rag_embed").time():
+        query_embedding = await _embed_question(settings, question)
+    with STAGE_SECONDS.labels("rag_search").time():
+        docs = store.query(query_embedding, settings.rag_top_k)
+    RAG_QUERIES.inc()
+    RAG_HITS.inc(len(docs))
     return RagResult(context=_format_context(docs), sources=_sources(docs))
@@ -1,31 +1,134 @@
 from __future__ import annotations
 
 import json
+import logging
 import os
 from dataclasses import dataclass
 from typing import Iterable
 
 import numpy as np
 
+logger = logging.getLogger("chatwoot-bot")
 
 @dataclass(frozen=True)
 class RagDocument:
+    """A stored chunk. Documents returned by a loaded store carry an empty
+    ``embedding``; their vectors live in the store's index."""
+
     id: str
     text: str
     metadata: dict
     embedding: list[float]
 
 
+# Queries are scored in blocks so a large batch never materialises a full
+# (queries x documents) similarity matrix at once; quantized documents are
+# widened to float32 in blocks of rows for the same reason.
+_QUERY_BLOCK = 256
+_DOC_BLOCK = 8192
+
+QUANTIZATIONS = ("float32", "float16", "int8")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1e-8, norms)
+
+
+def _top_k(sims: np.ndarray, top_k: int) -> np.ndarray:
+    """Column indices of the ``top_k`` largest values in each row, best first."""
+    if top_k < sims.shape[1]:
+        idxs = np.argpartition(-sims, top_k - 1, axis=1)[:, :top_k]
+    else:
+        idxs = np.broadcast_to(np.arange(sims.shape[1]), sims.shape)
+    order = np.argsort(-np.take_along_axis(sims, idxs, axis=1), axis=1)
+    return np.take_along_axis(idxs, order, axis=1)
+
+
+@dataclass(frozen=True)
+class QuantizedIndex:
+    """Unit-normalised document vectors in float32, float16 or int8.
+
+    int8 rows are symmetric per-vector quantized: ``vector ~= codes * scale``
+    with ``scale = max(|vector|) / 127``.
+    """
+
+    codes: np.ndarray
+    scales: np.ndarray | None = None
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, quantization: str) -> QuantizedIndex:
+        if quantization == "float16":
+            return cls(vectors.astype(np.float16))
+        if quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+            return cls(codes, scales.astype(np.float32))
+        return cls(np.ascontiguousarray(vectors, dtype=np.float32))
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each (normalised) query against every document."""
+        if self.codes.dtype == np.float32:
+            return queries @ self.codes.T
+        sims = np.empty((len(queries), len(self.codes)), dtype=np.float32)
+        for start in range(0, len(self.codes), _DOC_BLOCK):
+            block = self.codes[start:start + _DOC_BLOCK].astype(np.float32)
+            sims[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            sims *= self.scales
+        return sims
+
+
 class RagStore:
-    def __init__(self, path: str) -> None:
+    """JSONL-backed vector store.
+
+    Embeddings are moved out of the loaded documents into a ``QuantizedIndex``
+    so each vector is held once, as packed float32/float16/int8 rather than a
+    list of Python floats. With ``rerank_candidates`` set, that many candidates
+    from the quantized scan are re-scored against exact float32 vectors kept
+    in a memory-mapped ``<path>.f32.npy`` sidecar, so only the rows touched by
+    re-ranking are paged in. If the sidecar cannot be written (a read-only
+    store directory) the exact vectors stay in memory instead; ``rerank_source``
+    says which.
+    """
+
+    def __init__(self, path: str, quantization: str = "float32", rerank_candidates: int = 0) -> None:
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown RAG quantization: {quantization}")
         self.path = path
+        self.quantization = quantization
+        self.rerank_candidates = rerank_candidates if quantization != "float32" else 0
         self._docs: list[RagDocument] = []
         self._loaded = False
+        self._index: QuantizedIndex | None = None
+        self._exact: np.ndarray | None = None
+        self.rerank_source: str | None = None
+
+    def __len__(self) -> int:
+        self.load()
+        return len(self._docs)
+
+    @property
+    def dim(self) -> int:
+        self.load()
+        return self._index.codes.shape[1] if self._index is not None else 0
+
+    @property
+    def index_bytes(self) -> int:
+        """Resident size of the search index, excluding the re-rank sidecar."""
+        self.load()
+        return self._index.nbytes if self._index is not None else 0
 
     def load(self) -> None:
         if self._loaded:
             return
         self._docs = []
+        rows: list[np.ndarray] = []
         if os.path.exists(self.path):
             with open(self.path, "r", encoding="utf-8") as f:
                 for line in f:
@@ -33,21 +136,62 @@ class RagStore:
                     if not line:
                         continue
                     data = json.loads(line)
+                    rows.append(np.asarray(data["embedding"], dtype=np.float32))
                     self._docs.append(
                         RagDocument(
                             id=data["id"],
                             text=data["text"],
                             metadata=data.get("metadata", {}),
-                            embedding=data["embedding"],
+                            embedding=[],
                         )
                     )
+        self._index = None
+        self._exact = None
+        self.rerank_source = None
+        if rows:
+            vectors = _normalize(np.stack(rows))
+            del rows
+            self._index = QuantizedIndex.build(vectors, self.quantization)
+            if self.rerank_candidates > 0:
+                self._exact = self._exact_sidecar(vectors)
         self._loaded = True
 
+    def _exact_sidecar(self, vectors: np.ndarray) -> np.ndarray:
+        sidecar = f"{self.path}.f32.npy"
+        try:
+            if os.path.getmtime(sidecar) >= os.path.getmtime(self.path):
+                exact = np.load(sidecar, mmap_mode="r")
+                if exact.shape == vectors.shape:
+                    self.rerank_source = "sidecar"
+                    return exact
+        except (OSError, ValueError):
+            pass
+        # Several workers may rebuild at once; each writes its own temp file
+        # and the atomic rename leaves one complete copy.
+        tmp = f"{sidecar}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, vectors)
+            os.replace(tmp, sidecar)
+            exact = np.load(sidecar, mmap_mode="r")
+        except OSError as exc:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            logger.warning(
+                "Cannot write RAG re-rank sidecar %s (%s); keeping float32 vectors in memory",
+                sidecar,
+                exc,
+            )
+            self.rerank_source = "memory"
+            return vectors
+        self.rerank_source = "sidecar"
+        return exact
+
     def add_many(self, docs: Iterable[RagDocument]) -> None:
-        self.load()
         with open(self.path, "a", encoding="utf-8") as f:
             for doc in docs:
-                self._docs.append(doc)
                 f.write(
                     json.dumps(
                         {
@@ -60,19 +204,29 @@ class RagStore:
                     )
                     + "\n"
                 )
+        # The file is the source of truth; rebuild the index on next use.
+        self._loaded = False
 
     def query(self, query_embedding: list[float], top_k: int) -> list[RagDocument]:
-        self.load()
-        if not self._docs:
-            return []
-
-        query_vec = np.array(query_embedding, dtype=np.float32)
-        doc_vecs = np.array([doc.embedding for doc in self._docs], dtype=np.float32)
+        return self.query_batch([query_embedding], top_k)[0]
 
-        denom = (np.linalg.norm(doc_vecs, axis=1) * np.linalg.norm(query_vec))
-        denom = np.where(denom == 0, 1e-8, denom)
-        sims = doc_vecs @ query_vec / denom
+    def query_batch(self, query_embeddings: list[list[float]] | np.ndarray, top_k: int) -> list[list[RagDocument]]:
+        """Return the ``top_k`` most similar documents for each query, best first."""
+        self.load()
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if self._index is None:
+            return [[] for _ in range(len(queries))]
 
-        top_k = max(1, top_k)
-        idxs = np.argsort(-sims)[:top_k]
-        return [self._docs[i] for i in idxs]
+        top_k = min(max(1, top_k), len(self._docs))
+        candidates = min(max(top_k, self.rerank_candidates), len(self._docs))
+        results: list[list[RagDocument]] = []
+        for start in range(0, len(queries), _QUERY_BLOCK):
+            block = _normalize(queries[start:start + _QUERY_BLOCK])
+            idxs = _top_k(self._index.scores(block), candidates)
+            if self._exact is not None:
+                exact = np.einsum("qd,qcd->qc", block, self._exact[idxs])
+                idxs = np.take_along_axis(idxs, _top_k(exact, top_k), axis=1)
+            results.extend([self._docs[i] for i in row] for row in idxs)
+        return results
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+
+from .config import Settings
+from .metrics import HTTP_IN_FLIGHT, HTTP_REQUESTS
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# A 500/502/504 on a POST may arrive after the upstream already acted on it
+# (e.g. stored a message), so only statuses that mean "not processed" are
+# retried for non-idempotent requests.
+UNPROCESSED_STATUS_CODES = {429, 503}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Keeps a streamed response counted as in flight until it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, in_flight: Any) -> None:
+        self._stream = stream
+        self._in_flight = in_flight
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._in_flight.dec()
+        await self._stream.aclose()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without touching the network while a host's circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probe_started: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state != "half_open":
+            return False
+        # Let a single probe through; a probe that never reported back (e.g.
+        # cancelled) is superseded after another reset period.
+        now = time.monotonic()
+        if self._probe_started is None or now - self._probe_started >= self.reset_seconds:
+            self._probe_started = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        self._probe_started = None
+        self._failures += 1
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_buckets: dict[str, TokenBucket] = {}
+
+
+def _host_key(client: httpx.AsyncClient, url: str) -> str:
+    return client.base_url.join(url).netloc.decode("ascii")
+
+
+def get_breaker(settings: Settings, host: str) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = CircuitBreaker(settings.circuit_failure_threshold, settings.circuit_reset_seconds)
+        _breakers[host] = breaker
+    return breaker
+
+
+def get_bucket(settings: Settings, host: str) -> TokenBucket:
+    bucket = _buckets.get(host)
+    if bucket is None:
+        bucket = TokenBucket(settings.rate_limit_per_second, settings.rate_limit_burst)
+        _buckets[host] = bucket
+    return bucket
+
+
+def _retry_after_seconds(response: httpx.Response) -> float | None:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_delay(settings: Settings, attempt: int) -> float:
+    cap = min(settings.retry_max_delay_seconds, settings.retry_base_delay_seconds * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def _is_retryable_error(idempotent: bool, exc: httpx.TransportError) -> bool:
+    # Connection-level failures mean the request never reached the upstream,
+    # so they are safe to repeat even for POST.
+    if isinstance(exc, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return idempotent
+
+
+async def send_with_retry(
+    settings: Settings,
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    stream: bool = False,
+    idempotent: bool | None = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Send a request with retries; with ``stream=True`` the caller must close the response.
+
+    ``idempotent`` defaults to the HTTP method's semantics. Pass ``True`` for
+    POSTs without side effects (e.g. completions) so server errors are retried.
+    """
+    method = method.upper()
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    retry_statuses = RETRYABLE_STATUS_CODES if idempotent else UNPROCESSED_STATUS_CODES
+    host = _host_key(client, url)
+    breaker = get_breaker(settings, host)
+    bucket = get_bucket(settings, host)
+    attempts = max(1, settings.retry_max_attempts)
+
+    for attempt in range(attempts):
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}; skipping request")
+        await bucket.acquire()
+
+        in_flight = HTTP_IN_FLIGHT.labels(host)
+        in_flight.inc()
+        try:
+            response = await client.send(client.build_request(method, url, **kwargs), stream=stream)
+        except httpx.TransportError as exc:
+            in_flight.dec()
+            HTTP_REQUESTS.labels(host, "error").inc()
+            breaker.record_failure()
+            if attempt + 1 >= attempts or not _is_retryable_error(idempotent, exc):
+                raise
+            await asyncio.sleep(_backoff_delay(settings, attempt))
+            continue
+        except BaseException:
+            in_flight.dec()
+            raise
+        if stream and not response.is_closed:
+            # The body is still being read; count the connection until close.
+            response.stream = _TrackedStream(response.stream, in_flight)
+        else:
+            in_flight.dec()
+
+        HTTP_REQUESTS.labels(host, str(response.status_code)).inc()
+        if response.status_code not in RETRYABLE_STATUS_CODES:
+            breaker.record_success()
+            return response
+
+        # A 429 means the upstream is healthy but pacing us; only server
+        # errors count towards opening the circuit.
+        if response.status_code == 429:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        if attempt + 1 >= attempts or response.status_code not in retry_statuses:
+            return response
+
+        delay = _retry_after_seconds(response)
+        if delay is None:
+            delay = _backoff_delay(settings, attempt)
+        await response.aclose()
+        await asyncio.sleep(min(delay, settings.retry_max_delay_seconds))
+
+    raise RuntimeError("Retry loop exceeded")
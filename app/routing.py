@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import logging
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, field
+
+from .config import Settings
+from .metrics import register_collector
+from .openai_client import EscalationRequested, generate_reply
+
+logger = logging.getLogger("chatwoot-bot")
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+
+# A whole message made only of greetings, thanks or acknowledgements.
+_SMALL_TALK = re.compile(
+    r"(?:(?:\b(?:hi|hello|hey|thanks|thank you|thx|ok|okay|got it|good (?:morning|afternoon|evening)|bye)\b"
+    r"(?: there| so much| very much| a lot)?"
+    r"|こんにちは|こんばんは|おはよう(?:ございます)?|ありがとう(?:ございます|ございました)?"
+    r"|よろしく(?:お願いします|お願いいたします)?|はい|了解(?:です|しました)?|わかりました|承知しました"
+    r"|お疲れ(?:様です|さまです)?|さようなら|你好|谢谢)[\s,.!~、。！〜ー…]*)+",
+    re.IGNORECASE,
+)
+# A single FAQ-style question: a question mark, an English question word up
+# front or a Japanese interrogative ending.
+_FAQ_QUESTION = re.compile(
+    r"(?:[?？]\s*$"
+    r"|^(?:what|when|where|which|who|how|why|do|does|can|could|is|are|will|should)\b"
+    r"|(?:ですか|ますか|でしょうか|のか)[。\s]*$)",
+    re.IGNORECASE,
+)
+_COMPLEX_MARKERS = re.compile(
+    r"(error|exception|bug|crash|fail|not work|doesn't work|refund|contract|invoice|quote|"
+    r"hack|password|security|fraud|urgent|"
+    r"エラー|不具合|障害|動かない|起動しない|失敗|返金|契約|請求|見積|解約|設定方法|手順|"
+    r"乗っ取|不正|パスワード|ログインできない|緊急|至急|"
+    r"```|traceback|https?://)",
+    re.IGNORECASE,
+)
+# Wide (CJK) characters carry roughly a word each, so they count as several
+# Latin characters against ROUTING_FAST_MAX_CHARS.
+_WIDE_CHAR_WEIGHT = 3
+
+_LOW_CONFIDENCE_MARKERS = (
+    "分かりかねます",
+    "わかりかねます",
+    "わかりません",
+    "分かりません",
+    "お答えできません",
+    "i'm not sure",
+    "i am not sure",
+    "i don't know",
+    "i do not know",
+    "i cannot help",
+)
+
+
+@dataclass
+class TierStats:
+    requests: int = 0
+    failures: int = 0
+    escalations: int = 0
+    latency_seconds: float = 0.0
+    usage: dict[str, int] = field(default_factory=dict)
+
+
+_stats: dict[str, TierStats] = {FAST_TIER: TierStats(), STRONG_TIER: TierStats()}
+
+
+def tier_stats() -> dict[str, TierStats]:
+    return _stats
+
+
+def _message_length(text: str) -> int:
+    """Length in Latin-character equivalents, so the limit means the same in every language."""
+    return sum(_WIDE_CHAR_WEIGHT if unicodedata.east_asian_width(ch) in ("W", "F") else 1 for ch in text)
+
+
+def classify_message(settings: Settings, content: str) -> str:
+    """Send small talk and short one-line FAQ questions to the fast tier; everything else is strong."""
+    text = content.strip()
+    if not settings.openai_fast_model:
+        return STRONG_TIER
+    if _message_length(text) > settings.routing_fast_max_chars or "\n" in text:
+        return STRONG_TIER
+    if _COMPLEX_MARKERS.search(text):
+        return STRONG_TIER
+    if _SMALL_TALK.fullmatch(text):
+        return FAST_TIER
+    if text.count("?") + text.count("？") <= 1 and _FAQ_QUESTION.search(text):
+        return FAST_TIER
+    return STRONG_TIER
+
+
+def _is_low_confidence(reply: str) -> bool:
+    lowered = reply.lower()
+    return any(marker in lowered for marker in _LOW_CONFIDENCE_MARKERS)
+
+
+async def _generate_on_tier(
+    settings: Settings,
+    tier: str,
+    messages: list[dict],
+    tools: list[dict] | None,
+    tool_handlers: dict | None,
+    escalate_on: set[str] | None = None,
+) -> str:
+    stats = _stats[tier]
+    model = settings.openai_fast_model if tier == FAST_TIER else settings.openai_model
+    stats.requests += 1
+    started = time.perf_counter()
+    try:
+        return await generate_reply(
+            settings,
+            messages,
+            tools=tools,
+            tool_handlers=tool_handlers,
+            model=model,
+            escalate_on=escalate_on,
+            usage=stats.usage,
+        )
+    except EscalationRequested:
+        raise
+    except Exception:
+        stats.failures += 1
+        raise
+    finally:
+        stats.latency_seconds += time.perf_counter() - started
+
+
+async def route_and_generate(
+    settings: Settings,
+    content: str,
+    messages: list[dict],
+    tools: list[dict] | None = None,
+    tool_handlers: dict | None = None,
+) -> str:
+    tier = classify_message(settings, content) if settings.routing_enabled else STRONG_TIER
+    if tier == STRONG_TIER:
+        return await _generate_on_tier(settings, STRONG_TIER, messages, tools, tool_handlers)
+
+    # The fast tier works on a copy so an escalation can replay the original prompt.
+    try:
+        reply = await _generate_on_tier(
+            settings,
+            FAST_TIER,
+            list(messages),
+            tools,
+            tool_handlers,
+            escalate_on={"handoff_to_human"},
+        )
+        if not _is_low_confidence(reply):
+            return reply
+    except EscalationRequested:
+        pass
+    except Exception:
+        # Counted as a fast-tier failure by _generate_on_tier; the strong
+        # tier still gets a chance to answer.
+        logger.warning("Fast tier failed; escalating to %s", settings.openai_model, exc_info=True)
+
+    _stats[FAST_TIER].escalations += 1
+    return await _generate_on_tier(settings, STRONG_TIER, messages, tools, tool_handlers)
+
+
+def _collect_tier_metrics():
+    fields = (
+        ("bot_tier_requests_total", "counter", "LLM replies attempted per model tier.", "requests"),
+        ("bot_tier_failures_total", "counter", "Failed LLM replies per model tier.", "failures"),
+        ("bot_tier_escalations_total", "counter", "Replies escalated away from a model tier.", "escalations"),
+        ("bot_tier_latency_seconds_total", "counter", "Total LLM reply latency per model tier.", "latency_seconds"),
+    )
+    for name, kind, documentation, attr in fields:
+        yield name, kind, documentation, [
+            (name, {"tier": tier}, getattr(stats, attr)) for tier, stats in _stats.items()
+        ]
+
+
+register_collector(_collect_tier_metrics)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+from typing import Any, Awaitable, Callable
+
+from .config import Settings
+from .state import WORKER_ID, StateBackend
+
+logger = logging.getLogger("chatwoot-bot")
+
+Job = dict[str, Any]
+JobHandler = Callable[[Job], Awaitable[None]]
+
+_IDLE_POLL_SECONDS = 0.05
+_IDLE_POLL_MAX_SECONDS = 0.5
+
+
+def shard_for(settings: Settings, conversation_id: int) -> int:
+    return conversation_id % settings.shard_count
+
+
+def _queue_name(shard: int) -> str:
+    return f"shard:{shard}"
+
+
+def _lease_key(shard: int) -> str:
+    return f"lease:shard:{shard}"
+
+
+async def submit(backend: StateBackend, settings: Settings, conversation_id: int, job: Job) -> None:
+    await backend.enqueue(_queue_name(shard_for(settings, conversation_id)), json.dumps(job, ensure_ascii=False))
+
+
+class ShardDispatcher:
+    """Consumes the shard queues this worker holds a lease on.
+
+    Each conversation maps to one shard and each shard is consumed by exactly
+    one worker at a time, in enqueue order, so a conversation is never
+    processed by two workers at once or out of order. Workers heartbeat into
+    the backend and rebalance so every live worker owns about
+    ``shard_count / workers`` shards; a crashed worker's leases expire and
+    are picked up by the others.
+    """
+
+    def __init__(self, settings: Settings, backend: StateBackend, handler: JobHandler) -> None:
+        self.settings = settings
+        self.backend = backend
+        self.handler = handler
+        self._consumers: dict[int, asyncio.Task] = {}
+        self._draining: set[int] = set()
+        self._supervisor: asyncio.Task | None = None
+
+    @property
+    def owned_shards(self) -> list[int]:
+        return sorted(self._consumers)
+
+    def start(self) -> None:
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        self._draining.update(self._consumers)
+        await asyncio.gather(*self._consumers.values(), return_exceptions=True)
+        await self.backend.release_lease(f"worker:{WORKER_ID}", WORKER_ID)
+
+    async def _supervise(self) -> None:
+        ttl = self.settings.shard_lease_seconds
+        while True:
+            try:
+                await self._rebalance(ttl)
+            except Exception:
+                logger.exception("Shard rebalance failed")
+            await asyncio.sleep(ttl / 3)
+
+    async def _rebalance(self, ttl: float) -> None:
+        await self.backend.acquire_lease(f"worker:{WORKER_ID}", WORKER_ID, ttl)
+        workers = max(1, await self.backend.count_prefix("worker:"))
+        target = math.ceil(self.settings.shard_count / workers)
+
+        for shard in list(self._consumers):
+            if not await self.backend.acquire_lease(_lease_key(shard), WORKER_ID, ttl):
+                logger.warning("Lost lease on shard %s", shard)
+                self._draining.add(shard)
+
+        active = [shard for shard in self._consumers if shard not in self._draining]
+        for shard in active[target:]:
+            self._draining.add(shard)
+
+        owned = len(active)
+        for shard in range(self.settings.shard_count):
+            if owned >= target:
+                break
+            if shard in self._consumers:
+                continue
+            if await self.backend.acquire_lease(_lease_key(shard), WORKER_ID, ttl):
+                self._consumers[shard] = asyncio.create_task(self._consume(shard))
+                owned += 1
+
+    async def _consume(self, shard: int) -> None:
+        queue = _queue_name(shard)
+        idle = _IDLE_POLL_SECONDS
+        try:
+            while shard not in self._draining:
+                item = await self.backend.dequeue(queue)
+                if item is None:
+                    # Back off on an empty queue so idle shards cost little;
+                    # a busy shard keeps polling at the base interval.
+                    await asyncio.sleep(idle)
+                    idle = min(idle * 2, _IDLE_POLL_MAX_SECONDS)
+                    continue
+                idle = _IDLE_POLL_SECONDS
+                try:
+                    await self.handler(json.loads(item))
+                except Exception:
+                    logger.exception("Shard %s job failed", shard)
+        finally:
+            self._draining.discard(shard)
+            self._consumers.pop(shard, None)
+            await self.backend.release_lease(_lease_key(shard), WORKER_ID)
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import asyncio
+import importlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from .config import Settings
+
+logger = logging.getLogger("chatwoot-bot")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_LOCK_POLL_SECONDS = 0.05
+_PURGE_INTERVAL_SECONDS = 60.0
+
+
+class StateBackend(ABC):
+    """Shared state for locks, dedup keys, caches and shard queues.
+
+    Every worker process talks to the same backend, so anything stored here
+    is visible across workers. Keys expire after their TTL.
+    """
+
+    @abstractmethod
+    async def claim(self, key: str, ttl_seconds: float) -> bool:
+        """Set ``key`` if it is absent or expired; return whether it was set."""
+
+    @abstractmethod
+    async def get(self, key: str) -> str | None:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    async def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """Take or renew ``key`` for ``owner`` unless another owner holds it."""
+
+    @abstractmethod
+    async def release_lease(self, key: str, owner: str) -> None:
+        ...
+
+    @abstractmethod
+    async def count_prefix(self, prefix: str) -> int:
+        """Number of live keys starting with ``prefix``."""
+
+    @abstractmethod
+    async def enqueue(self, queue: str, item: str) -> None:
+        ...
+
+    @abstractmethod
+    async def dequeue(self, queue: str) -> str | None:
+        ...
+
+    async def close(self) -> None:
+        return None
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local backend; the default for a single uvicorn worker."""
+
+    def __init__(self) -> None:
+        self._values: dict[str, tuple[str, float]] = {}
+        self._queues: dict[str, deque[str]] = {}
+        self._last_purge = time.time()
+
+    def _purge(self) -> None:
+        # Dedup and marker keys are usually never read again, so expired
+        # entries are swept periodically rather than only on lookup.
+        now = time.time()
+        if now - self._last_purge < _PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        for key in [key for key, (_, expires_at) in self._values.items() if expires_at <= now]:
+            del self._values[key]
+
+    def _live(self, key: str) -> str | None:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        if item[1] <= time.time():
+            del self._values[key]
+            return None
+        return item[0]
+
+    async def claim(self, key: str, ttl_seconds: float) -> bool:
+        self._purge()
+        if self._live(key) is not None:
+            return False
+        self._values[key] = ("1", time.time() + ttl_seconds)
+        return True
+
+    async def get(self, key: str) -> str | None:
+        return self._live(key)
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        self._purge()
+        self._values[key] = (value, time.time() + ttl_seconds)
+
+    async def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        self._purge()
+        current = self._live(key)
+        if current is not None and current != owner:
+            return False
+        self._values[key] = (owner, time.time() + ttl_seconds)
+        return True
+
+    async def release_lease(self, key: str, owner: str) -> None:
+        if self._live(key) == owner:
+            del self._values[key]
+
+    async def count_prefix(self, prefix: str) -> int:
+        return sum(1 for key in list(self._values) if key.startswith(prefix) and self._live(key) is not None)
+
+    async def enqueue(self, queue: str, item: str) -> None:
+        self._queues.setdefault(queue, deque()).append(item)
+
+    async def dequeue(self, queue: str) -> str | None:
+        items = self._queues.get(queue)
+        return items.popleft() if items else None
+
+
+class SqliteStateBackend(StateBackend):
+    """File-backed backend shared by all worker processes on one host."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, item TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS queue_name_id ON queue (name, id)")
+
+    def _run(self, fn):
+        with self._lock:
+            now = time.time()
+            if now - self._last_purge >= _PURGE_INTERVAL_SECONDS:
+                self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+                self._last_purge = now
+            return fn(self._conn)
+
+    async def _call(self, fn):
+        return await asyncio.to_thread(self._run, fn)
+
+    async def claim(self, key: str, ttl_seconds: float) -> bool:
+        def _claim(conn: sqlite3.Connection) -> bool:
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, '1', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE kv.expires_at <= ?",
+                (key, now + ttl_seconds, now),
+            )
+            return cursor.rowcount == 1
+
+        return await self._call(_claim)
+
+    async def get(self, key: str) -> str | None:
+        def _get(conn: sqlite3.Connection) -> str | None:
+            row = conn.execute("SELECT value FROM kv WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+            return row[0] if row else None
+
+        return await self._call(_get)
+
+    async def set(self, key: str, value: str, ttl_seconds: float) -> None:
+        def _set(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl_seconds),
+            )
+
+        await self._call(_set)
+
+    async def acquire_lease(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        def _acquire(conn: sqlite3.Connection) -> bool:
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+                "WHERE kv.value = excluded.value OR kv.expires_at <= ?",
+                (key, owner, now + ttl_seconds, now),
+            )
+            return cursor.rowcount == 1
+
+        return await self._call(_acquire)
+
+    async def release_lease(self, key: str, owner: str) -> None:
+        await self._call(lambda conn: conn.execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, owner)))
+
+    async def count_prefix(self, prefix: str) -> int:
+        def _count(conn: sqlite3.Connection) -> int:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM kv WHERE substr(key, 1, ?) = ? AND expires_at > ?",
+                (len(prefix), prefix, time.time()),
+            ).fetchone()
+            return int(row[0])
+
+        return await self._call(_count)
+
+    async def enqueue(self, queue: str, item: str) -> None:
+        await self._call(lambda conn: conn.execute("INSERT INTO queue (name, item) VALUES (?, ?)", (queue, item)))
+
+    async def dequeue(self, queue: str) -> str | None:
+        def _dequeue(conn: sqlite3.Connection) -> str | None:
+            # Check without the write lock first; idle shards are polled far
+            # more often than they hold work.
+            if conn.execute("SELECT 1 FROM queue WHERE name = ? LIMIT 1", (queue,)).fetchone() is None:
+                return None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT id, item FROM queue WHERE name = ? ORDER BY id LIMIT 1", (queue,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM queue WHERE id = ?", (row[0],))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return row[1] if row else None
+
+        return await self._call(_dequeue)
+
+    async def close(self) -> None:
+        await self._call(lambda conn: conn.close())
+
+
+_backend: StateBackend | None = None
+
+
+def _create_backend(settings: Settings) -> StateBackend:
+    kind = settings.state_backend
+    if kind == "memory":
+        return MemoryStateBackend()
+    if kind == "sqlite":
+        return SqliteStateBackend(settings.state_path)
+    # Any other value is a "module:Class" path to a custom StateBackend that
+    # takes the settings, e.g. one backed by a network store for multi-node.
+    module_name, _, class_name = kind.partition(":")
+    if not class_name:
+        raise RuntimeError(f"Unknown STATE_BACKEND: {kind}")
+    return getattr(importlib.import_module(module_name), class_name)(settings)
+
+
+def get_backend(settings: Settings) -> StateBackend:
+    global _backend
+    if _backend is None:
+        _backend = _create_backend(settings)
+    return _backend
+
+
+async def close_backend() -> None:
+    global _backend
+    backend, _backend = _backend, None
+    if backend is not None:
+        await backend.close()
+
+
+@asynccontextmanager
+async def conversation_lock(backend: StateBackend, key: str, ttl_seconds: float) -> AsyncIterator[None]:
+    """Hold ``key`` exclusively across all workers.
+
+    The lease is renewed every ``ttl_seconds / 3`` while held, so it only
+    expires if the holding worker dies.
+    """
+    owner = f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+    while not await backend.acquire_lease(key, owner, ttl_seconds):
+        await asyncio.sleep(_LOCK_POLL_SECONDS)
+
+    async def _renew() -> None:
+        # Keep the lease alive while the holder is still working, so a slow
+        # reply never lets another worker take the conversation.
+        while True:
+            await asyncio.sleep(ttl_seconds / 3)
+            try:
+                if not await backend.acquire_lease(key, owner, ttl_seconds):
+                    logger.warning("Lost lease on %s while holding it", key)
+                    return
+            except Exception:
+                logger.exception("Failed to renew lease on %s", key)
+
+    renewer = asyncio.create_task(_renew())
+    try:
+        yield
+    finally:
+        renewer.cancel()
+        await backend.release_lease(key, owner)
@@ -1,15 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Awaitable, Callable
 
 from .config import Settings
+from .http_tools import ToolError, build_http_handler
+from .metrics import register_collector
 
 ToolHandler = Callable[[dict[str, Any]], Awaitable[str]]
 
+_CACHE_MAX_ENTRIES = 1024
+
 
 @dataclass(frozen=True)
 class ToolSpec:
@@ -17,6 +24,93 @@ class ToolSpec:
     description: str
     parameters: dict[str, Any]
     handler: ToolHandler
+    timeout_seconds: float | None = None
+    cache_ttl_seconds: float = 0.0
+
+
+@dataclass
+class ToolStats:
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    cache_hits: int = 0
+    latency_seconds: float = 0.0
+
+
+_stats: dict[str, ToolStats] = {}
+_cache: dict[tuple[str, str], tuple[float, str]] = {}
+
+
+def tool_stats() -> dict[str, ToolStats]:
+    return _stats
+
+
+def _collect_tool_metrics():
+    fields = (
+        ("bot_tool_calls_total", "Tool handler executions.", "calls"),
+        ("bot_tool_failures_total", "Tool handler errors.", "failures"),
+        ("bot_tool_timeouts_total", "Tool handler timeouts.", "timeouts"),
+        ("bot_tool_cache_hits_total", "Tool results served from cache.", "cache_hits"),
+        ("bot_tool_latency_seconds_total", "Total tool handler latency.", "latency_seconds"),
+    )
+    for name, documentation, attr in fields:
+        yield name, "counter", documentation, [
+            (name, {"tool": tool}, getattr(stats, attr)) for tool, stats in _stats.items()
+        ]
+
+
+register_collector(_collect_tool_metrics)
+
+
+def _cache_put(key: tuple[str, str], expires_at: float, result: str) -> None:
+    if len(_cache) >= _CACHE_MAX_ENTRIES:
+        now = time.monotonic()
+        for stale in [k for k, (exp, _) in _cache.items() if exp <= now]:
+            del _cache[stale]
+        while len(_cache) >= _CACHE_MAX_ENTRIES:
+            del _cache[next(iter(_cache))]
+    _cache[key] = (expires_at, result)
+
+
+def _instrument(spec: ToolSpec, count_failures: bool = True) -> ToolHandler:
+    stats = _stats.setdefault(spec.name, ToolStats())
+
+    async def _handle(arguments: dict[str, Any]) -> str:
+        key = None
+        if spec.cache_ttl_seconds > 0:
+            key = (spec.name, json.dumps(arguments, sort_keys=True, ensure_ascii=False))
+            cached = _cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                stats.cache_hits += 1
+                return cached[1]
+
+        stats.calls += 1
+        started = time.perf_counter()
+        try:
+            if spec.timeout_seconds:
+                result = await asyncio.wait_for(spec.handler(arguments), spec.timeout_seconds)
+            else:
+                result = await spec.handler(arguments)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            return f"Tool '{spec.name}' timed out after {spec.timeout_seconds:g}s"
+        except ToolError as exc:
+            # Transient failures reach the model but are not cached, so the
+            # next call retries once the tool host recovers.
+            stats.failures += 1
+            return str(exc)
+        except Exception:
+            if count_failures:
+                stats.failures += 1
+            raise
+        finally:
+            stats.latency_seconds += time.perf_counter() - started
+
+        if key is not None:
+            _cache_put(key, time.monotonic() + spec.cache_ttl_seconds, result)
+        return result
+
+    return _handle
 
 
 def _schema_time() -> ToolSpec:
@@ -57,7 +151,7 @@ def _handoff_spec(handler: ToolHandler) -> ToolSpec:
     )
 
 
-def _load_custom_specs(path: Path) -> list[ToolSpec]:
+def _load_custom_specs(settings: Settings, path: Path, default_timeout: float | None = None) -> list[ToolSpec]:
     if not path.exists() or not path.is_file():
         return []
 
@@ -68,50 +162,80 @@ def _load_custom_specs(path: Path) -> list[ToolSpec]:
     for item in data.get("tools", []):
         name = item.get("name")
         handler_key = item.get("handler")
-        if not name or not handler_key:
+        http_config = item.get("http")
+        if not name:
             continue
-        if handler_key not in builtin:
+        if isinstance(http_config, dict) and http_config.get("url"):
+            spec = ToolSpec(
+                name=name,
+                description=item.get("description", ""),
+                parameters=item.get("parameters", {"type": "object", "properties": {}, "required": []}),
+                handler=build_http_handler(settings, name, http_config),
+            )
+        elif handler_key in builtin:
+            spec = builtin[handler_key]
+        else:
             continue
-        spec = builtin[handler_key]
         specs.append(
             ToolSpec(
                 name=name,
                 description=item.get("description", spec.description),
                 parameters=item.get("parameters", spec.parameters),
                 handler=spec.handler,
+                timeout_seconds=float(item.get("timeout_seconds", default_timeout or 0)) or None,
+                cache_ttl_seconds=float(item.get("cache_ttl_seconds", 0)),
             )
         )
 
     return specs
 
 
-def load_tools(
-    settings: Settings,
-    handoff_handler: ToolHandler | None = None,
-    handoff_only: bool = False,
-) -> tuple[list[dict[str, Any]], dict[str, ToolHandler]]:
+def _function_schema(spec: ToolSpec) -> dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": spec.name,
+            "description": spec.description,
+            "parameters": spec.parameters,
+        },
+    }
+
+
+@lru_cache(maxsize=8)
+def compile_tools(settings: Settings) -> tuple[tuple[dict[str, Any], ...], dict[str, ToolHandler]]:
+    """Build tool schemas and instrumented handlers once per settings.
+
+    ``tools.json`` is read here, so changes take effect after a restart.
+    """
     builtin = _builtin_specs()
-    specs = [] if handoff_only else list(builtin.values())
+    default_timeout = settings.tool_timeout_seconds or None
+    specs = [replace(spec, timeout_seconds=default_timeout) for spec in builtin.values()]
 
-    custom = _load_custom_specs(Path(settings.tools_config_path)) if not handoff_only else []
+    custom = _load_custom_specs(settings, Path(settings.tools_config_path), default_timeout)
     if custom:
         specs = custom
 
-    if handoff_handler:
-        specs = [spec for spec in specs if spec.name != "handoff_to_human"]
-        specs.append(_handoff_spec(handoff_handler))
+    specs = [spec for spec in specs if spec.name != "handoff_to_human"]
+    return tuple(_function_schema(spec) for spec in specs), {spec.name: _instrument(spec) for spec in specs}
 
-    tools = []
+
+def load_tools(
+    settings: Settings,
+    handoff_handler: ToolHandler | None = None,
+    handoff_only: bool = False,
+) -> tuple[list[dict[str, Any]], dict[str, ToolHandler]]:
+    tools: list[dict[str, Any]] = []
     handlers: dict[str, ToolHandler] = {}
-    for spec in specs:
-        tools.append({
-            "type": "function",
-            "function": {
-                "name": spec.name,
-                "description": spec.description,
-                "parameters": spec.parameters,
-            },
-        })
-        handlers[spec.name] = spec.handler
+    if not handoff_only:
+        compiled_tools, compiled_handlers = compile_tools(settings)
+        tools.extend(compiled_tools)
+        handlers.update(compiled_handlers)
+
+    if handoff_handler:
+        spec = _handoff_spec(handoff_handler)
+        tools.append(_function_schema(spec))
+        # The handoff handler signals success by raising, so exceptions from it
+        # are not counted as tool failures.
+        handlers[spec.name] = _instrument(spec, count_failures=False)
 
     return tools, handlers
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+from .config import Settings
+from .http_pool import get_client
+from .openai_client import _headers as _llm_headers
+from .prompting import load_system_prompt
+from .rag import embed_questions, get_store
+from .rag_store import QUANTIZATIONS, RagStore
+from .state import get_backend
+from .tools import compile_tools
+
+logger = logging.getLogger("chatwoot-bot")
+
+
+@dataclass
+class Readiness:
+    """Startup progress reported by ``/health`` and ``/ready``."""
+
+    warm: bool = False
+    started_at: float = field(default_factory=time.perf_counter)
+    warmup_seconds: float | None = None
+    checks: dict[str, dict[str, Any]] = field(default_factory=dict)
+    retry: set[str] = field(default_factory=set)
+
+    @property
+    def ready(self) -> bool:
+        return self.warm and all(check["ok"] for check in self.checks.values())
+
+    def record(self, name: str, ok: bool, detail: str, started: float, retry: bool = False) -> None:
+        """Store a check result; ``retry`` marks a failure worth re-checking later."""
+        previous = self.checks.get(name)
+        self.checks[name] = {"ok": ok, "detail": detail, "seconds": round(time.perf_counter() - started, 3)}
+        if ok:
+            self.retry.discard(name)
+            if previous is not None and not previous["ok"]:
+                logger.info("Readiness check %s recovered: %s", name, detail)
+        else:
+            if retry:
+                self.retry.add(name)
+            if previous is None or previous["ok"] or previous["detail"] != detail:
+                logger.warning("Readiness check %s failed: %s", name, detail)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warm": self.warm,
+            "warmup_seconds": self.warmup_seconds,
+            "checks": self.checks,
+        }
+
+
+def _validate_settings(settings: Settings) -> list[str]:
+    problems = []
+    for name in ("chatwoot_base_url", "openai_base_url"):
+        if not getattr(settings, name).startswith(("http://", "https://")):
+            problems.append(f"{name.upper()} must be an http(s) URL")
+    positive = (
+        "request_timeout_seconds",
+        "http_max_connections",
+        "retry_max_attempts",
+        "rag_top_k",
+        "conversation_lock_seconds",
+        "shard_lease_seconds",
+    )
+    for name in positive:
+        if getattr(settings, name) <= 0:
+            problems.append(f"{name.upper()} must be positive")
+    for name in ("history_messages", "shard_count", "max_tool_rounds", "rag_embed_cache_size", "rag_rerank_candidates"):
+        if getattr(settings, name) < 0:
+            problems.append(f"{name.upper()} must not be negative")
+    if settings.rag_quantization not in QUANTIZATIONS:
+        problems.append(f"RAG_QUANTIZATION must be one of {', '.join(QUANTIZATIONS)}")
+    if settings.summary_enabled and settings.summary_recent_messages <= 0:
+        problems.append("SUMMARY_RECENT_MESSAGES must be positive")
+    if settings.state_backend not in {"memory", "sqlite"} and ":" not in settings.state_backend:
+        problems.append("STATE_BACKEND must be memory, sqlite or module:Class")
+    if settings.readiness_recheck_seconds <= 0:
+        problems.append("READINESS_RECHECK_SECONDS must be positive")
+    if settings.routing_enabled and not settings.openai_fast_model:
+        problems.append("ROUTING_ENABLED requires OPENAI_FAST_MODEL")
+    return problems
+
+
+def prepare(settings: Settings, readiness: Readiness) -> None:
+    """Load everything local before the app accepts traffic; raises if unusable."""
+    started = time.perf_counter()
+    problems = _validate_settings(settings)
+    readiness.record("settings", not problems, "; ".join(problems) or "ok", started)
+    if problems:
+        raise RuntimeError(f"Invalid settings: {'; '.join(problems)}")
+
+    started = time.perf_counter()
+    prompt = load_system_prompt(settings)
+    readiness.record("prompt", True, f"{len(prompt)} chars", started)
+
+    started = time.perf_counter()
+    get_backend(settings)
+    readiness.record("state", True, settings.state_backend, started)
+
+    if settings.tools_enabled:
+        started = time.perf_counter()
+        schemas, _ = compile_tools(settings)
+        readiness.record("tools", True, f"{len(schemas)} tools", started)
+
+    if settings.rag_enabled:
+        _check_rag_index(settings, readiness, get_store(settings))
+
+
+def _check_rag_index(settings: Settings, readiness: Readiness, store: RagStore) -> None:
+    started = time.perf_counter()
+    chunks = len(store)
+    detail = f"{chunks} chunks, dim {store.dim}, {settings.rag_quantization}, {store.index_bytes / 2**20:.1f} MiB"
+    if store.rerank_source == "memory":
+        detail += f", rerank {store.rerank_candidates} from memory (sidecar not writable)"
+    elif store.rerank_source:
+        detail += f", rerank {store.rerank_candidates} from sidecar"
+    readiness.record(
+        "rag_index",
+        chunks > 0,
+        detail if chunks else f"{settings.rag_store_path} is empty or missing",
+        started,
+    )
+
+
+async def _open_connections(
+    settings: Settings,
+    name: str,
+    base_url: str,
+    path: str,
+    headers: dict[str, str],
+    readiness: Readiness,
+) -> None:
+    # Any HTTP response means the TCP/TLS connection is up and pooled; the
+    # status itself does not matter. Plain requests bypass the retry layer so
+    # a slow upstream cannot trip the circuit breaker before the first message.
+    started = time.perf_counter()
+    client = get_client(settings, base_url)
+    results = await asyncio.gather(
+        *(client.get(path, headers=headers) for _ in range(max(1, settings.warmup_connections))),
+        return_exceptions=True,
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    statuses = sorted({result.status_code for result in results if isinstance(result, httpx.Response)})
+    if errors:
+        readiness.record(name, False, f"{type(errors[0]).__name__}: {errors[0]}", started, retry=True)
+    else:
+        readiness.record(name, True, f"{len(results)} connections (HTTP {', '.join(map(str, statuses))})", started)
+
+
+async def _warm_embeddings(settings: Settings, readiness: Readiness) -> None:
+    started = time.perf_counter()
+    path = Path(settings.rag_warmup_questions_path or "")
+    questions = [line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    questions = questions[: settings.rag_embed_cache_size]
+    if not questions:
+        readiness.record("embedding_cache", True, f"no questions in {path}", started)
+        return
+    dim = await embed_questions(settings, questions)
+    index_dim = get_store(settings).dim
+    if index_dim and dim != index_dim:
+        readiness.record(
+            "embedding_cache",
+            False,
+            f"{settings.openai_embed_model} returns dim {dim} but the RAG index has dim {index_dim}",
+            started,
+        )
+        return
+    readiness.record("embedding_cache", True, f"{len(questions)} questions", started)
+
+
+def _upstream_steps(settings: Settings, readiness: Readiness) -> dict[str, Callable[[], Awaitable[None]]]:
+    steps = {
+        "chatwoot_pool": lambda: _open_connections(
+            settings, "chatwoot_pool", settings.chatwoot_base_url, "/api", {}, readiness
+        ),
+        "llm_pool": lambda: _open_connections(
+            settings, "llm_pool", settings.openai_base_url, "/models", _llm_headers(settings), readiness
+        ),
+    }
+    if settings.rag_enabled and settings.rag_warmup_questions_path:
+        steps["embedding_cache"] = lambda: _warm_embeddings(settings, readiness)
+    return steps
+
+
+async def _run_steps(settings: Settings, readiness: Readiness, steps: dict[str, Callable[[], Awaitable[None]]]) -> None:
+    async def _guarded(name: str, step: Callable[[], Awaitable[None]]) -> None:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(step(), settings.warmup_timeout_seconds)
+        except asyncio.TimeoutError:
+            readiness.record(name, False, f"timed out after {settings.warmup_timeout_seconds:g}s", started, retry=True)
+        except Exception as exc:
+            logger.exception("Warm-up step %s failed", name)
+            readiness.record(name, False, f"{type(exc).__name__}: {exc}", started, retry=True)
+
+    await asyncio.gather(*(_guarded(name, step) for name, step in steps.items()))
+
+
+async def warm_up(settings: Settings, readiness: Readiness) -> None:
+    """Open upstream connections and fill the embedding cache, then mark the app warm.
+
+    Failures are recorded in ``readiness`` rather than raised, and transient
+    ones (an unreachable upstream, a timeout) are retried every
+    ``READINESS_RECHECK_SECONDS`` so ``/ready`` recovers once the upstream
+    does. The RAG index check is refreshed on the same schedule so it
+    follows reloads of the store.
+    """
+    steps = _upstream_steps(settings, readiness)
+    await _run_steps(settings, readiness, steps)
+    readiness.warm = True
+    readiness.warmup_seconds = round(time.perf_counter() - readiness.started_at, 3)
+    logger.info("Warm-up finished in %.2fs: ready=%s", readiness.warmup_seconds, readiness.ready)
+
+    while True:
+        await asyncio.sleep(settings.readiness_recheck_seconds)
+        if settings.rag_enabled:
+            _check_rag_index(settings, readiness, get_store(settings))
+        failed = {name: step for name, step in steps.items() if name in readiness.retry}
+        if failed:
+            await _run_steps(settings, readiness, failed)
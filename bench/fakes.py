@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+@dataclass
+class UpstreamBehaviour:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+
+    async def delay(self) -> None:
+        seconds = (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def failure(self) -> Response | None:
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "0.1"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return JSONResponse({"error": "bad gateway"}, status_code=502)
+        return None
+
+
+@dataclass
+class ChatwootState:
+    behaviour: UpstreamBehaviour = field(default_factory=UpstreamBehaviour)
+    history: dict[int, list[dict[str, Any]]] = field(default_factory=dict)
+    replies: int = 0
+    on_reply: Callable[[int, str, float], None] | None = None
+    _next_id: int = 1
+
+    def add_message(self, conversation_id: int, content: str, incoming: bool) -> dict[str, Any]:
+        message = {
+            "id": self._next_id,
+            "content": content,
+            "message_type": 0 if incoming else 1,
+            "sender_type": "contact" if incoming else "agent_bot",
+            "private": False,
+        }
+        self._next_id += 1
+        self.history.setdefault(conversation_id, []).append(message)
+        return message
+
+
+def create_chatwoot_app(state: ChatwootState) -> FastAPI:
+    app = FastAPI()
+    prefix = "/api/v1/accounts/{account_id}/conversations/{conversation_id}"
+
+    @app.get(prefix + "/messages")
+    async def list_messages(account_id: int, conversation_id: int, limit: int = 20) -> Response:
+        await state.behaviour.delay()
+        failure = state.behaviour.failure()
+        if failure is not None:
+            return failure
+        return JSONResponse({"payload": state.history.get(conversation_id, [])[-limit:]})
+
+    @app.post(prefix + "/messages")
+    async def create_message(account_id: int, conversation_id: int, request: Request) -> Response:
+        await state.behaviour.delay()
+        failure = state.behaviour.failure()
+        if failure is not None:
+            return failure
+        body = await request.json()
+        state.add_message(conversation_id, body.get("content", ""), incoming=False)
+        state.replies += 1
+        if state.on_reply is not None:
+            state.on_reply(conversation_id, body.get("content", ""), time.perf_counter())
+        return JSONResponse({"id": state._next_id})
+
+    @app.post(prefix + "/assignments")
+    async def assign(account_id: int, conversation_id: int) -> Response:
+        await state.behaviour.delay()
+        return JSONResponse({})
+
+    @app.post(prefix + "/toggle_status")
+    async def toggle_status(account_id: int, conversation_id: int) -> Response:
+        await state.behaviour.delay()
+        return JSONResponse({"payload": {"current_status": "open"}})
+
+    return app
+
+
+@dataclass
+class LlmState:
+    behaviour: UpstreamBehaviour = field(default_factory=UpstreamBehaviour)
+    # "json" answers with a normal completion, "sse" streams events with a
+    # text/event-stream content type, "sse_mislabeled" streams events under
+    # application/json (some OpenAI-compatible proxies do this).
+    mode: str = "json"
+    reply_chars: int = 200
+    chunk_chars: int = 8
+    embed_dim: int = 1536
+    requests: int = 0
+
+
+def _echo_reply(messages: list[dict[str, Any]], reply_chars: int) -> str:
+    last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    # The load generator matches replies to requests by this prefix.
+    reply = f"echo:{last_user}|"
+    return reply + "x" * max(0, reply_chars - len(reply))
+
+
+def _sse_body(model: str, text: str, chunk_chars: int) -> str:
+    events = []
+    for start in range(0, len(text), chunk_chars):
+        chunk = {
+            "id": "chatcmpl-bench",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": text[start:start + chunk_chars]}, "finish_reason": None}],
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    final = {"id": "chatcmpl-bench", "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+    events.append(f"data: {json.dumps(final)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events)
+
+
+def _fake_embedding(text: str, dim: int) -> list[float]:
+    seed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big")
+    rng = random.Random(seed)
+    return [rng.uniform(-1, 1) for _ in range(dim)]
+
+
+def create_llm_app(state: LlmState) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request) -> Response:
+        state.requests += 1
+        await state.behaviour.delay()
+        failure = state.behaviour.failure()
+        if failure is not None:
+            return failure
+        body = await request.json()
+        model = body.get("model", "bench-model")
+        text = _echo_reply(body.get("messages") or [], state.reply_chars)
+
+        if state.mode == "json":
+            prompt_tokens = sum(len(str(m.get("content") or "")) for m in body.get("messages") or []) // 4
+            return JSONResponse(
+                {
+                    "id": "chatcmpl-bench",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4},
+                }
+            )
+        media_type = "text/event-stream" if state.mode == "sse" else "application/json"
+        return Response(_sse_body(model, text, state.chunk_chars), media_type=media_type)
+
+    @app.post("/embeddings")
+    async def embeddings(request: Request) -> Response:
+        await state.behaviour.delay()
+        body = await request.json()
+        texts = body.get("input") or []
+        if isinstance(texts, str):
+            texts = [texts]
+        data = [
+            {"object": "embedding", "index": i, "embedding": _fake_embedding(text, state.embed_dim)}
+            for i, text in enumerate(texts)
+        ]
+        return JSONResponse({"object": "list", "data": data})
+
+    return app
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+
+import httpx
+import uvicorn
+
+from .fakes import ChatwootState, LlmState, UpstreamBehaviour, create_chatwoot_app, create_llm_app
+
+ACCOUNT_ID = 1
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _rss_kib(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def _tree_rss_kib(pid: int) -> int | None:
+    """RSS of ``pid`` plus its direct children (uvicorn workers)."""
+    total = _rss_kib(pid)
+    if total is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", encoding="ascii") as f:
+            children = [int(p) for p in f.read().split()]
+    except OSError:
+        children = []
+    return total + sum(_rss_kib(child) or 0 for child in children)
+
+
+@dataclass
+class LoadResults:
+    sent: int = 0
+    duplicates: int = 0
+    accepted: int = 0
+    webhook_errors: int = 0
+    timeouts: int = 0
+    replies_posted: int = 0
+    ack_latencies: list[float] = field(default_factory=list)
+    reply_latencies: list[float] = field(default_factory=list)
+    peak_rss_kib: int | None = None
+    wall_seconds: float = 0.0
+
+
+async def _serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+def _start_app(args: argparse.Namespace, port: int, chatwoot_port: int, llm_port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update(
+        {
+            "CHATWOOT_BASE_URL": f"http://127.0.0.1:{chatwoot_port}",
+            "CHATWOOT_API_TOKEN": "bench",
+            "OPENAI_API_KEY": "bench",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}",
+            "HISTORY_MESSAGES": str(args.history_messages),
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "app.main:app",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(port),
+        "--log-level",
+        "warning",
+        "--no-access-log",
+    ]
+    if args.workers > 1:
+        command += ["--workers", str(args.workers)]
+    return subprocess.Popen(command, env=env)
+
+
+async def _wait_ready(client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("app did not become healthy in time")
+
+
+def _webhook_payload(conversation_id: int, message: dict) -> dict:
+    return {
+        "event": "message_created",
+        "id": message["id"],
+        "message_type": "incoming",
+        "content": message["content"],
+        "private": False,
+        "account": {"id": ACCOUNT_ID},
+        "conversation": {"id": conversation_id, "status": "pending"},
+        "sender": {"type": "contact", "id": conversation_id},
+    }
+
+
+async def run_load(args: argparse.Namespace) -> LoadResults:
+    chatwoot = ChatwootState(
+        behaviour=UpstreamBehaviour(args.chatwoot_latency_ms, args.jitter_ms, args.chatwoot_error_rate),
+    )
+    llm = LlmState(
+        behaviour=UpstreamBehaviour(args.llm_latency_ms, args.jitter_ms, args.llm_error_rate, args.llm_rate_limit_rate),
+        mode=args.llm_mode,
+        reply_chars=args.reply_chars,
+    )
+    chatwoot_port, llm_port = _free_port(), _free_port()
+    fake_servers = [
+        await _serve(create_chatwoot_app(chatwoot), chatwoot_port),
+        await _serve(create_llm_app(llm), llm_port),
+    ]
+
+    app_port = _free_port()
+    process = _start_app(args, app_port, chatwoot_port, llm_port)
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    pending: dict[str, asyncio.Future] = {}
+
+    def on_reply(conversation_id: int, content: str, received_at: float) -> None:
+        key = content.split("|", 1)[0].removeprefix("echo:")
+        future = pending.get(key)
+        if future is not None and not future.done():
+            future.set_result(received_at)
+
+    chatwoot.on_reply = on_reply
+    results = LoadResults()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    for conversation_id in range(1, args.conversations + 1):
+        for i in range(args.seed_history):
+            chatwoot.add_message(conversation_id, f"earlier message {i} " + "lorem ipsum " * 10, incoming=i % 2 == 0)
+
+    async def send(client: httpx.AsyncClient, payload: dict) -> None:
+        results.sent += 1
+        started = time.perf_counter()
+        try:
+            response = await client.post("/webhook/chatwoot", json=payload)
+        except httpx.TransportError:
+            results.webhook_errors += 1
+            return
+        results.ack_latencies.append(time.perf_counter() - started)
+        if response.status_code != 200:
+            results.webhook_errors += 1
+        elif response.json().get("accepted"):
+            results.accepted += 1
+
+    async def conversation(client: httpx.AsyncClient, conversation_id: int) -> None:
+        for seq in range(args.messages_per_conversation):
+            content = f"c{conversation_id}-m{seq} what are your opening hours?"
+            message = chatwoot.add_message(conversation_id, content, incoming=True)
+            payload = _webhook_payload(conversation_id, message)
+            future = asyncio.get_running_loop().create_future()
+            pending[content] = future
+            sent_at = time.perf_counter()
+            sends = [send(client, payload)]
+            if random.random() < args.duplicate_rate:
+                results.duplicates += 1
+                sends.append(send(client, payload))
+            await asyncio.gather(*sends)
+            try:
+                received_at = await asyncio.wait_for(future, args.reply_timeout)
+                results.reply_latencies.append(received_at - sent_at)
+            except asyncio.TimeoutError:
+                results.timeouts += 1
+            finally:
+                pending.pop(content, None)
+            if args.think_time_ms:
+                await asyncio.sleep(args.think_time_ms / 1000)
+
+    async def sample_memory() -> None:
+        while True:
+            rss = _tree_rss_kib(process.pid)
+            if rss is not None:
+                results.peak_rss_kib = max(results.peak_rss_kib or 0, rss)
+            await asyncio.sleep(0.25)
+
+    try:
+        async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=30) as client:
+            await _wait_ready(client)
+            sampler = asyncio.create_task(sample_memory())
+            started = time.perf_counter()
+            tasks = []
+            for offset in range(0, args.conversations, args.burst_size):
+                for conversation_id in range(offset + 1, min(args.conversations, offset + args.burst_size) + 1):
+                    tasks.append(asyncio.create_task(conversation(client, conversation_id)))
+                if args.burst_interval_ms:
+                    await asyncio.sleep(args.burst_interval_ms / 1000)
+            await asyncio.gather(*tasks)
+            results.wall_seconds = time.perf_counter() - started
+            sampler.cancel()
+            # Give late duplicate replies a moment to land before counting them.
+            await asyncio.sleep(0.5)
+            results.replies_posted = chatwoot.replies
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        for server in fake_servers:
+            server.should_exit = True
+        await asyncio.sleep(0.1)
+
+    return results
+
+
+def _format_ms(seconds: float) -> str:
+    return f"{seconds * 1000:8.1f} ms"
+
+
+def report(results: LoadResults) -> str:
+    replies = len(results.reply_latencies)
+    lines = [
+        f"webhooks sent      {results.sent} (duplicates {results.duplicates}, accepted {results.accepted}, errors {results.webhook_errors})",
+        f"replies received   {replies} (timeouts {results.timeouts}, total posted {results.replies_posted})",
+        f"wall time          {results.wall_seconds:.2f} s",
+        f"webhook req/s      {results.sent / results.wall_seconds if results.wall_seconds else 0:.1f}",
+        f"reply throughput   {replies / results.wall_seconds if results.wall_seconds else 0:.1f} replies/s",
+    ]
+    for label, values in (("ack latency", results.ack_latencies), ("reply latency", results.reply_latencies)):
+        lines.append(
+            f"{label:<18} p50 {_format_ms(percentile(values, 50))}  p95 {_format_ms(percentile(values, 95))}"
+            f"  p99 {_format_ms(percentile(values, 99))}"
+        )
+    if results.peak_rss_kib is not None:
+        lines.append(f"peak app RSS       {results.peak_rss_kib / 1024:.1f} MiB")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end load test against fake Chatwoot and LLM servers")
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--messages-per-conversation", type=int, default=5)
+    parser.add_argument("--seed-history", type=int, default=20, help="Messages pre-loaded into each conversation")
+    parser.add_argument("--history-messages", type=int, default=10, help="HISTORY_MESSAGES for the app")
+    parser.add_argument("--burst-size", type=int, default=25, help="Conversations started together")
+    parser.add_argument("--burst-interval-ms", type=float, default=200)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="Probability a webhook is delivered twice")
+    parser.add_argument("--think-time-ms", type=float, default=0)
+    parser.add_argument("--concurrency", type=int, default=100, help="Max connections to the app")
+    parser.add_argument("--reply-timeout", type=float, default=30)
+    parser.add_argument("--chatwoot-latency-ms", type=float, default=20)
+    parser.add_argument("--chatwoot-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--llm-mode", choices=["json", "sse", "sse_mislabeled"], default="json")
+    parser.add_argument("--reply-chars", type=int, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app under test")
+    args = parser.parse_args()
+
+    print(report(asyncio.run(run_load(args))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+
+from app.ingest import _chunk_text
+from app.openai_client import ChatCompletionAccumulator, SseDecoder, _parse_sse_chat_completion
+from app.rag_store import RagDocument, RagStore
+
+from .legacy_sse import parse_sse_chat_completion as legacy_parse_sse
+
+
+def measure(fn: Callable[[], object], min_seconds: float = 0.5, max_runs: int = 10_000) -> tuple[float, int]:
+    """Return (mean seconds per call, runs) after warming ``fn`` once."""
+    fn()
+    runs = 0
+    started = time.perf_counter()
+    while runs < max_runs:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            break
+    return (time.perf_counter() - started) / runs, runs
+
+
+def _row(name: str, size: str, per_call: float, runs: int) -> str:
+    return f"{name:<28} {size:>24} {per_call * 1000:10.3f} ms/op {1 / per_call:12.1f} ops/s  ({runs} runs)"
+
+
+def build_store(path: str, docs: int, dim: int, seed: int = 0, vectors: np.ndarray | None = None) -> RagStore:
+    if vectors is None:
+        vectors = np.random.default_rng(seed).standard_normal((docs, dim), dtype=np.float32)
+    store = RagStore(path)
+    store.add_many(
+        RagDocument(id=str(i), text=f"document {i}", metadata={"title": f"doc-{i}"}, embedding=vectors[i].tolist())
+        for i in range(len(vectors))
+    )
+    return RagStore(path)
+
+
+def bench_rag_query(sizes: list[int], dim: int, top_k: int, batch_size: int = 64) -> list[str]:
+    rows = []
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"store-{size}.jsonl")
+            store = build_store(path, size, dim)
+            started = time.perf_counter()
+            store.load()
+            rows.append(_row("RagStore.load", f"{size}x{dim}", time.perf_counter() - started, 1))
+            query = rng.standard_normal(dim).astype(np.float32).tolist()
+            rows.append(_row("RagStore.query", f"{size}x{dim}", *measure(lambda: store.query(query, top_k))))
+            batch = rng.standard_normal((batch_size, dim)).astype(np.float32)
+            per_call, runs = measure(lambda: store.query_batch(batch, top_k))
+            rows.append(_row(f"RagStore.query_batch/{batch_size}", f"{size}x{dim}", per_call / batch_size, runs))
+    return rows
+
+
+def clustered_vectors(rng: np.random.Generator, count: int, dim: int, clusters: int = 64) -> np.ndarray:
+    """Vectors bunched around a few topics, so near neighbours are close as in real embeddings."""
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    noise = rng.standard_normal((count, dim), dtype=np.float32) * 0.6
+    return centers[rng.integers(0, clusters, count)] + noise
+
+
+def bench_quantization(sizes: list[int], dim: int, top_k: int, rerank: int, queries: int = 256) -> list[str]:
+    """Index memory, per-query search time and overlap with exact float32 top-k per index format."""
+    rows = []
+    rng = np.random.default_rng(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"quant-{size}.jsonl")
+            vectors = clustered_vectors(rng, size, dim)
+            build_store(path, size, dim, vectors=vectors)
+            batch = vectors[rng.integers(0, size, queries)] + rng.standard_normal((queries, dim), dtype=np.float32) * 0.3
+            exact = [[doc.id for doc in docs] for docs in RagStore(path).query_batch(batch, top_k)]
+            for quantization, candidates in (("float32", 0), ("float16", 0), ("int8", 0), ("int8", rerank)):
+                store = RagStore(path, quantization, candidates)
+                store.load()
+                found = store.query_batch(batch, top_k)
+                overlap = sum(len(set(e) & {doc.id for doc in docs}) for e, docs in zip(exact, found)) / (queries * top_k)
+                per_call, runs = measure(lambda: store.query_batch(batch, top_k), min_seconds=0.3)
+                name = quantization if not candidates else f"{quantization}+rerank{candidates}"
+                rows.append(
+                    f"{name:<28} {f'{size}x{dim}':>24} {store.index_bytes / 2**20:8.2f} MiB"
+                    f" {per_call / queries * 1000:8.3f} ms/query  exact@{top_k} {overlap:.4f}  ({runs} runs)"
+                )
+    return rows
+
+
+def bench_chunk_text(sizes: list[int], chunk_size: int, overlap: int) -> list[str]:
+    rows = []
+    rng = random.Random(2)
+    for size in sizes:
+        text = "".join(rng.choice("abcdefghij klmnopqrstuvwxyz。、日本語") for _ in range(size))
+        rows.append(_row("_chunk_text", f"{size} chars", *measure(lambda: _chunk_text(text, chunk_size, overlap))))
+    return rows
+
+
+def sse_body(deltas: int, tool_argument_deltas: int = 0, chunk_chars: int = 4) -> str:
+    events = []
+    for i in range(deltas):
+        chunk = {
+            "id": "bench",
+            "model": "bench",
+            "choices": [{"index": 0, "delta": {"content": f"{i % 10}" * chunk_chars}, "finish_reason": None}],
+        }
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    for i in range(tool_argument_deltas):
+        delta = {"tool_calls": [{"index": 0, "function": {"arguments": "a" * chunk_chars}}]}
+        if i == 0:
+            delta["tool_calls"][0].update({"id": "call_0", "type": "function"})
+            delta["tool_calls"][0]["function"]["name"] = "lookup"
+        chunk = {"id": "bench", "model": "bench", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        events.append(f"data: {json.dumps(chunk)}\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events)
+
+
+def _decode_stream(chunks: list[bytes]) -> dict:
+    decoder = SseDecoder()
+    accumulator = ChatCompletionAccumulator()
+    for chunk in chunks:
+        for event in decoder.feed(chunk):
+            accumulator.add_event(event)
+    for event in decoder.flush():
+        accumulator.add_event(event)
+    return accumulator.result()
+
+
+def bench_sse(sizes: list[int], stream_chunk_bytes: int = 1024) -> list[str]:
+    """Compare the original whole-body parser with the incremental decoder on long responses."""
+    rows = []
+    for size in sizes:
+        body = sse_body(size, tool_argument_deltas=size // 4)
+        raw = body.encode("utf-8")
+        chunks = [raw[i:i + stream_chunk_bytes] for i in range(0, len(raw), stream_chunk_bytes)]
+        label = f"{size} deltas"
+        rows.append(_row("legacy SSE parser", label, *measure(lambda: legacy_parse_sse(body))))
+        rows.append(_row("_parse_sse_chat_completion", label, *measure(lambda: _parse_sse_chat_completion(body))))
+        rows.append(_row("SseDecoder stream", label, *measure(lambda: _decode_stream(chunks))))
+    return rows
+
+
+def _webhook_payload(event: str, message_type: str = "incoming") -> bytes:
+    conversation = {
+        "id": 42,
+        "inbox_id": 3,
+        "status": "pending",
+        "messages": [{"id": i, "content": "previous message " * 8, "message_type": 0} for i in range(10)],
+        "meta": {"sender": {"id": 7, "name": "Customer", "email": "customer@example.com"}},
+        "custom_attributes": {f"attr_{i}": "value" for i in range(20)},
+    }
+    payload = {
+        "event": event,
+        "id": 1001,
+        "content": "What are your opening hours?",
+        "message_type": message_type,
+        "private": False,
+        "account": {"id": 1, "name": "Bench"},
+        "inbox": {"id": 3, "name": "Website"},
+        "conversation": conversation,
+        "sender": {"id": 7, "type": "contact", "name": "Customer"},
+    }
+    return json.dumps(payload).encode("utf-8")
+
+
+def bench_webhook(requests: int) -> list[str]:
+    """Requests/sec of the webhook acceptor for events it does not process."""
+    import httpx
+
+    os.environ.setdefault("CHATWOOT_API_TOKEN", "bench")
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from app.main import app
+
+    cases = [
+        ("conversation_updated", _webhook_payload("conversation_updated")),
+        ("conversation_typing_on", _webhook_payload("conversation_typing_on")),
+        ("message_created outgoing", _webhook_payload("message_created", "outgoing")),
+    ]
+
+    async def run(body: bytes) -> float:
+        transport = httpx.ASGITransport(app=app)
+        headers = {"content-type": "application/json"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.post("/webhook/chatwoot", content=body, headers=headers)
+            started = time.perf_counter()
+            for _ in range(requests):
+                await client.post("/webhook/chatwoot", content=body, headers=headers)
+            return (time.perf_counter() - started) / requests
+
+    return [_row("webhook acceptor", name, asyncio.run(run(body)), requests) for name, body in cases]
+
+
+def _sizes(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for retrieval, quantization, chunking and SSE parsing")
+    parser.add_argument("--rag-sizes", type=_sizes, default=[500, 2000, 8000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--query-batch", type=int, default=64)
+    parser.add_argument("--text-sizes", type=_sizes, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=120)
+    parser.add_argument("--sse-sizes", type=_sizes, default=[100, 1_000, 10_000, 50_000])
+    parser.add_argument("--webhook-requests", type=int, default=2000)
+    parser.add_argument("--quant-sizes", type=_sizes, default=[2000, 20_000])
+    parser.add_argument("--rerank", type=int, default=32, help="Candidates re-scored in float32 for the int8+rerank row")
+    parser.add_argument("--only", choices=["rag", "quant", "chunk", "sse", "webhook"], default=None)
+    args = parser.parse_args()
+
+    if args.only in (None, "rag"):
+        print("\n".join(bench_rag_query(args.rag_sizes, args.dim, args.top_k, args.query_batch)))
+    if args.only in (None, "quant"):
+        print("\n".join(bench_quantization(args.quant_sizes, args.dim, args.top_k, args.rerank)))
+    if args.only in (None, "chunk"):
+        print("\n".join(bench_chunk_text(args.text_sizes, args.chunk_size, args.chunk_overlap)))
+    if args.only in (None, "sse"):
+        print("\n".join(bench_sse(args.sse_sizes)))
+    if args.only in (None, "webhook"):
+        print("\n".join(bench_webhook(args.webhook_requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.config import load_settings
+from app.http_pool import close_clients
+from app.http_tools import build_http_handler
+from app.tools import ToolSpec, _cache, _instrument, tool_stats
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    requests: list[dict] = []
+    outages = 0
+
+    def _reply(self, status: int, payload: object) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _record(self, body: object = None) -> None:
+        self.requests.append(
+            {"method": self.command, "path": self.path, "auth": self.headers.get("Authorization"), "body": body}
+        )
+
+    def do_GET(self) -> None:
+        self._record()
+        if self.path.startswith("/orders/missing"):
+            self._reply(404, {"error": "not found"})
+        elif self.path.startswith("/orders/flaky") and _StubHandler.outages > 0:
+            _StubHandler.outages -= 1
+            self._reply(503, {"error": "unavailable"})
+        else:
+            self._reply(200, {"data": {"status": "shipped", "items": [{"sku": "A-1"}]}})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"null")
+        self._record(body)
+        self._reply(200, {"ok": True, "echo": body})
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    _StubHandler.requests = []
+    _StubHandler.outages = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", _StubHandler.requests
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setenv("CHATWOOT_API_TOKEN", "test")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("RETRY_MAX_ATTEMPTS", "1")
+    monkeypatch.setenv("SHOP_TOKEN", "secret")
+    return load_settings()
+
+
+def _call(settings, config: dict, *calls: dict, cache_ttl_seconds: float = 0.0) -> list[str]:
+    spec = ToolSpec(
+        name="lookup",
+        description="",
+        parameters={},
+        handler=build_http_handler(settings, "lookup", config),
+        cache_ttl_seconds=cache_ttl_seconds,
+    )
+    handler = _instrument(spec)
+
+    async def run() -> list[str]:
+        try:
+            return [await handler(arguments) for arguments in calls]
+        finally:
+            await close_clients()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def clean_tool_state():
+    _cache.clear()
+    tool_stats().clear()
+    yield
+    _cache.clear()
+    tool_stats().clear()
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_get_renders_url_and_extracts_response_path(settings, stub_server):
+    base, requests = stub_server
+    config = {
+        "url": base + "/orders/{order_id}",
+        "query": {"lang": "ja"},
+        "headers": {"Authorization": "Bearer ${SHOP_TOKEN}"},
+        "response_path": "data.status",
+    }
+
+    assert _call(settings, config, {"order_id": "A/1 2"}) == ["shipped"]
+    assert requests[0]["path"] == "/orders/A%2F1%202?lang=ja"
+    assert requests[0]["auth"] == "Bearer secret"
+
+
+def test_post_body_keeps_argument_types(settings, stub_server):
+    base, requests = stub_server
+    config = {
+        "method": "POST",
+        "url": base + "/tickets",
+        "body": {"quantity": "{quantity}", "note": "order {order_id}"},
+        "response_path": "echo",
+    }
+
+    [result] = _call(settings, config, {"quantity": 3, "order_id": "A-1"})
+
+    assert json.loads(result) == {"quantity": 3, "note": "order A-1"}
+    assert requests[0]["body"] == {"quantity": 3, "note": "order A-1"}
+
+
+def test_http_error_status_becomes_tool_result(settings, stub_server):
+    base, _ = stub_server
+    result = _call(settings, {"url": base + "/orders/missing"}, {})
+
+    assert result == ["Tool 'lookup' failed with HTTP status 404"]
+
+
+def test_unreachable_host_becomes_tool_result(settings):
+    result = _call(settings, {"url": f"http://127.0.0.1:{_closed_port()}/orders/1"}, {})
+
+    assert result == ["Tool 'lookup' failed: ConnectError"]
+
+
+def test_transient_failures_are_not_cached(settings, stub_server):
+    base, requests = stub_server
+    _StubHandler.outages = 1
+    config = {"url": base + "/orders/flaky", "response_path": "data.status"}
+
+    results = _call(settings, config, {"id": 1}, {"id": 1}, {"id": 1}, cache_ttl_seconds=60)
+
+    assert results == ["Tool 'lookup' failed with HTTP status 503", "shipped", "shipped"]
+    assert len(requests) == 2
+    stats = tool_stats()["lookup"]
+    assert (stats.calls, stats.failures, stats.cache_hits) == (2, 1, 1)
+
+
+def test_unreachable_host_is_not_cached(settings):
+    config = {"url": f"http://127.0.0.1:{_closed_port()}/orders/1"}
+
+    results = _call(settings, config, {"id": 1}, {"id": 1}, cache_ttl_seconds=60)
+
+    assert results == ["Tool 'lookup' failed: ConnectError"] * 2
+    assert tool_stats()["lookup"].cache_hits == 0
+    assert not _cache
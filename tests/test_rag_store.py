@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from app.rag_store import RagStore
+
+
+def _write_store(path, count: int = 40, dim: int = 16) -> np.ndarray:
+    vectors = np.random.default_rng(0).standard_normal((count, dim)).astype(np.float32)
+    with open(path, "w", encoding="utf-8") as f:
+        for i, vector in enumerate(vectors):
+            f.write(json.dumps({"id": f"doc-{i}", "text": f"text {i}", "embedding": vector.tolist()}) + "\n")
+    return vectors
+
+
+def test_rerank_uses_sidecar(tmp_path):
+    path = tmp_path / "store.jsonl"
+    vectors = _write_store(path)
+    store = RagStore(str(path), "int8", rerank_candidates=8)
+
+    assert store.query(vectors[3].tolist(), 1)[0].id == "doc-3"
+    assert store.rerank_source == "sidecar"
+    assert os.path.exists(f"{path}.f32.npy")
+
+
+def test_unwritable_sidecar_keeps_exact_vectors_in_memory(tmp_path):
+    path = tmp_path / "store.jsonl"
+    vectors = _write_store(path)
+    # A directory in the sidecar's place makes both the load and the rename fail.
+    os.mkdir(f"{path}.f32.npy")
+    store = RagStore(str(path), "int8", rerank_candidates=8)
+
+    assert store.query(vectors[5].tolist(), 1)[0].id == "doc-5"
+    assert store.rerank_source == "memory"
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
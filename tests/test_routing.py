@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import pytest
+
+from app.config import load_settings
+from app.routing import FAST_TIER, STRONG_TIER, classify_message
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setenv("CHATWOOT_API_TOKEN", "test")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "fast-model")
+    monkeypatch.setenv("ROUTING_FAST_MAX_CHARS", "80")
+    return load_settings()
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "Hi!",
+        "Thanks a lot.",
+        "ok, thank you",
+        "ありがとうございます！",
+        "こんにちは。よろしくお願いします",
+        "What are your opening hours?",
+        "Do you ship to Canada",
+        "営業時間は何時までですか？",
+        "送料はいくらですか",
+    ],
+)
+def test_small_talk_and_short_questions_use_fast_tier(settings, message):
+    assert classify_message(settings, message) == FAST_TIER
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "My account was hacked and someone changed my password, please help now",
+        "アカウントが乗っ取られてパスワードも変更されてしまいました。今すぐ対応してください。注文履歴も見覚えがないものがあります。",
+        "okay so my server is down",
+        "history of my orders",
+        "Hi, I was charged twice for my order",
+        "注文した商品がまだ届きません",
+        "Where is my order? And can I change the address?",
+        "I'd like to cancel.\nOrder 1234",
+        "ログイン画面でエラーが出ます？",
+    ],
+)
+def test_statements_and_complaints_use_strong_tier(settings, message):
+    assert classify_message(settings, message) == STRONG_TIER
+
+
+def test_wide_characters_count_against_the_length_limit(settings):
+    question = "この商品の色違いやサイズ違いの在庫は店舗でも確認できますか"
+
+    assert len(question) < settings.routing_fast_max_chars
+    assert classify_message(settings, question) == STRONG_TIER
+    assert classify_message(settings, "在庫は店舗で確認できますか") == FAST_TIER
+
+
+def test_without_fast_model_everything_is_strong(monkeypatch, settings):
+    monkeypatch.setenv("OPENAI_FAST_MODEL", "")
+
+    assert classify_message(load_settings(), "Hi!") == STRONG_TIER
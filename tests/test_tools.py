@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.config import load_settings
+from app.tools import load_tools, tool_stats
+
+
+class _Handoff(Exception):
+    pass
+
+
+def test_handoff_is_not_counted_as_a_tool_failure(monkeypatch):
+    monkeypatch.setenv("CHATWOOT_API_TOKEN", "test")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    tool_stats().pop("handoff_to_human", None)
+
+    async def request_handoff(arguments: dict) -> str:
+        raise _Handoff(arguments.get("reason", ""))
+
+    _, handlers = load_tools(load_settings(), handoff_handler=request_handoff, handoff_only=True)
+
+    with pytest.raises(_Handoff):
+        asyncio.run(handlers["handoff_to_human"]({"reason": "asked for a human"}))
+    stats = tool_stats()["handoff_to_human"]
+    assert (stats.calls, stats.failures) == (1, 0)